@@ -0,0 +1,122 @@
+"""
+Benchmarks the hot product queries on the original schema, before any of the
+migrations, against the same products once they've been migrated to the latest
+schema, on databases of increasing size.
+
+Usage: python benchmarks/bench_db.py [size ...]
+"""
+
+import os, sys, time, random, tempfile, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from db import DB
+from connection import connections
+
+# Number of different queries that the products are spread over
+NUM_QUERIES = 100
+
+# Fraction of the products that are due to be cleaned up
+STALE = 0.001
+
+# Number of times to repeat each timed statement
+REPEATS = 5
+
+def populate(db, size):
+    """
+    Fills the original PRODUCTS table with fake products. Like in a long running database, most of them
+    were seen recently and only a small slice is old enough to be cleaned up.
+    """
+
+    now = datetime.datetime.utcnow()
+    rows = []
+
+    for id in range(size):
+        found = now - datetime.timedelta(seconds=random.randrange(7 * 24 * 60 * 60))
+
+        if random.random() < STALE:
+            seen = now - datetime.timedelta(days=7, seconds=random.randrange(60 * 60))
+        else:
+            seen = now - (now - found) * random.random()
+
+        rows.append((
+            7000000000 + id,
+            f'Product #{id}',
+            f'https://area.craigslist.org/sss/d/product/{7000000000 + id}.html',
+            f'https://area.craigslist.org/search/sss?query=q{id % NUM_QUERIES}',
+            found.strftime('%Y-%m-%d %H:%M:%S'),
+            seen.strftime('%Y-%m-%d %H:%M:%S'),
+        ))
+
+    with db.conn:
+        db.conn.executemany('INSERT INTO PRODUCTS VALUES(?, ?, ?, ?, ?, ?);', rows)
+
+def timed(func):
+    """
+    Returns the best time out of several runs of a function, in milliseconds
+    """
+
+    best = float('inf')
+
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
+
+def rolled_back(db, statements):
+    # Run the statements, but roll them back so each run sees the same data
+    def run():
+        db.conn.execute('BEGIN;')
+        statements()
+        db.conn.rollback()
+
+    return run
+
+def expire_products(db, limit=500):
+    # Run the same statements as a batch of DB.expire_products
+    mappings = db.conn.execute('SELECT QUERY, ID FROM PRODUCT_QUERIES WHERE SEEN <= datetime("now", "-7 days") ORDER BY SEEN LIMIT ?;', [limit]).fetchall()
+    db.conn.executemany('DELETE FROM PRODUCT_QUERIES WHERE QUERY = ? AND ID = ?;', mappings)
+
+    products = db.conn.execute('SELECT ID FROM PRODUCTS WHERE SEEN <= datetime("now", "-7 days") ORDER BY SEEN LIMIT ?;', [limit]).fetchall()
+    db.conn.executemany('DELETE FROM PRODUCTS WHERE ID = ?;', products)
+
+def run_original(db, query_url):
+    # The statements that DB used to run, before the products were mapped to their queries and indexed
+    return {
+        'count': timed(lambda: db.conn.execute('SELECT COUNT(ID) FROM PRODUCTS WHERE QUERY = ?;', [query_url]).fetchone()),
+        'list': timed(lambda: db.conn.execute('SELECT * FROM PRODUCTS WHERE QUERY = ? ORDER BY FOUND;', [query_url]).fetchall()),
+        'clean up': timed(rolled_back(db, lambda: db.conn.execute('DELETE FROM PRODUCTS WHERE datetime("now") >= datetime(SEEN, "+7 days");'))),
+    }
+
+def run_latest(db, query_url):
+    return {
+        'count': timed(lambda: db.get_num_products(query_url)),
+        'list': timed(lambda: db.get_products(query_url)),
+        'clean up': timed(rolled_back(db, lambda: expire_products(db))),
+    }
+
+def main(sizes):
+    print(f'{"products":>10} {"query":>10} {"original (ms)":>14} {"latest (ms)":>14} {"speedup":>8}')
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as dir:
+            # Create a database with just the original schema and fill it up
+            db = DB(os.path.join(dir, 'bench.db'), version=1)
+
+            populate(db, size)
+
+            query_url = f'https://area.craigslist.org/search/sss?query=q{NUM_QUERIES // 2}'
+            before = run_original(db, query_url)
+
+            # Now migrate the products to the latest schema and try again
+            db.migrate()
+            after = run_latest(db, query_url)
+
+            for name in before:
+                print(f'{size:>10} {name:>10} {before[name]:>14.2f} {after[name]:>14.2f} {before[name] / after[name]:>7.1f}x')
+
+            connections.close()
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -0,0 +1,106 @@
+"""
+Benchmarks rendering the new-product email digests, comparing the original string concatenation
+based renderer with the current one under different per-query caps and message size limits.
+
+Usage: python benchmarks/bench_email.py [number of products]
+"""
+
+import os, sys, time, datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from config import config
+from db import Product
+import send_email
+
+# Number of times to repeat each render
+REPEATS = 3
+
+def original_build_email(total_products):
+    # The original rendering from send_email.build_email
+    contents = ''
+    total_found = 0
+
+    for i, (query, products) in enumerate(total_products.items()):
+        contents += f'<b>Products found for {query}:</b>'
+        contents += '<ul>'
+
+        for product in products:
+            contents += f'<li><a href="{product.url}" style="color: #670067;text-decoration: underline;">{product.name}</a></li>'
+            total_found += 1
+
+        contents += '</ul>'
+
+        if i != len(total_products)-1:
+            contents += '<br><hr><br>'
+
+    date = datetime.datetime.now()
+
+    subject = f'CL-Checker - {total_found} new products found!'
+    body = send_email.template.format(
+        new_products=total_found,
+        contents=contents,
+        date=date.strftime('%B %d %Y'),
+        time=date.strftime('%I:%M %p'),
+        part=''
+    )
+
+    return [(subject, body, '')]
+
+def make_products(total, num_queries):
+    """
+    Spreads fake products over a number of queries, with names that need escaping
+    """
+
+    total_products = {}
+
+    for id in range(total):
+        query = f'area/section/query {id % num_queries}'
+        total_products.setdefault(query, []).append(Product(
+            str(7000000000 + id),
+            f'Product #{id} - "Great" condition, <must> go & cheap',
+            f'https://area.craigslist.org/sss/d/product/{7000000000 + id}.html',
+            query
+        ))
+
+    return total_products
+
+def timed(func):
+    """
+    Returns the best time out of several runs of a function in milliseconds, along with it's result
+    """
+
+    best = float('inf')
+
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000, result
+
+def main(total):
+    renderers = [
+        ('original', None, None),
+        ('uncapped', 0, 0),
+        ('split', 0, config.email_max_bytes),
+        ('default', config.email_max_per_query, config.email_max_bytes),
+    ]
+
+    print(f'{"queries":>8} {"renderer":>10} {"time (ms)":>10} {"emails":>7} {"largest (KB)":>13}')
+
+    for num_queries in [1, 100, 1000]:
+        total_products = make_products(total, num_queries)
+
+        for name, max_per_query, max_bytes in renderers:
+            if max_per_query == None:
+                elapsed, emails = timed(lambda: original_build_email(total_products))
+            else:
+                config.email_max_per_query = max_per_query
+                config.email_max_bytes = max_bytes
+                elapsed, emails = timed(lambda: send_email.build_emails(total_products))
+
+            largest = max(len(body.encode()) for subject, body, text in emails)
+            print(f'{num_queries:>8} {name:>10} {elapsed:>10.1f} {len(emails):>7} {largest / 1024:>13.1f}')
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
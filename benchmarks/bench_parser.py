@@ -0,0 +1,136 @@
+"""
+Benchmarks the result page parsers against the recorded fixtures, reporting the per-page latency,
+rows per second and peak Python memory of each parser implementation.
+
+The original BeautifulSoup based parsing is included as a baseline if bs4 is installed. Note that
+tracemalloc only sees Python allocations, so lxml's own memory use isn't included in the peak.
+
+Usage: python benchmarks/bench_parser.py [fixture name filter]
+"""
+
+import os, sys, re, glob, time, statistics, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import page_parser
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Number of times each fixture is parsed by each implementation
+REPEATS = 20
+
+def soup_page1(source):
+    # The original parsing from Updater.search_page1
+    soup = BeautifulSoup(source, 'html.parser')
+    results = soup.find('ul', {'id': 'search-results'})
+    stop_tag = soup.find('h4', {'class': 'ban nearby'})
+
+    if stop_tag != None:
+        rows = stop_tag.find_all_previous('li', {'class': 'result-row'})
+    else:
+        rows = results.find_all('li', {'class': 'result-row'})
+
+    links = [row.find('a', {'class': 'result-title hdrlnk'}) for row in rows]
+    return [(link.get('data-id'), link.text, link.get('href')) for link in links]
+
+def soup_page2(source):
+    # The original parsing from Updater.search_page2
+    soup = BeautifulSoup(source, 'html.parser')
+    results = soup.find('div', {'id': 'search-results-page-1'})
+    stop_tag = results.find('li', {'class': 'nearby-separator'})
+
+    if stop_tag != None:
+        rows = stop_tag.find_all_previous('li', {'class': 'cl-search-result'})
+    else:
+        rows = results.find_all('li', {'class': 'cl-search-result'})
+
+    products = []
+
+    for row in rows:
+        link = row.find('a', {'class': 'titlestring'})
+        url = link.get('href')
+        id = re.findall(r'^.+/(\d+)\.html$', url)
+
+        if len(id):
+            products.append((id[0], link.text, url))
+
+    return products
+
+def implementations():
+    """
+    Returns the available parser implementations, as (name, layout 1 parser, layout 2 parser)
+    """
+
+    impls = []
+
+    if page_parser.lxml_html != None:
+        impls.append(('lxml', page_parser.parse_page1, page_parser.parse_page2))
+
+    impls.append((
+        'python',
+        lambda source: page_parser.parse_page1(source, use_lxml=False),
+        lambda source: page_parser.parse_page2(source, use_lxml=False)
+    ))
+
+    if BeautifulSoup != None:
+        impls.append(('bs4', soup_page1, soup_page2))
+
+    return impls
+
+def measure(parse, source):
+    """
+    Returns the rows, median latency in seconds and peak memory in bytes of parsing a page
+    """
+
+    times = []
+
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        rows = parse(source)
+        times.append(time.perf_counter() - start)
+
+    # Measure the memory separately, as tracing slows everything down
+    tracemalloc.start()
+    parse(source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return rows, statistics.median(times), peak
+
+def main(filter):
+    paths = sorted(glob.glob(os.path.join(FIXTURES_DIR, f'*{filter}*.html')))
+    if not paths:
+        print(f'No fixtures found in {FIXTURES_DIR}, generate them with make_fixtures.py')
+        return
+
+    print(f'{"fixture":<26} {"parser":<8} {"rows":>5} {"latency (ms)":>13} {"rows/sec":>10} {"peak (KiB)":>11} {"speedup":>8}')
+
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+
+        name = os.path.basename(path)
+        layout = 2 if name.startswith('layout2') else 1
+
+        expected = None
+        baseline = None
+
+        for impl, parse1, parse2 in reversed(implementations()):
+            rows, latency, peak = measure(parse2 if layout == 2 else parse1, source)
+
+            # Make sure that all of the parsers agree with each other
+            if expected == None:
+                expected = sorted(rows)
+                baseline = latency
+            elif sorted(rows) != expected:
+                print(f'{name:<26} {impl:<8} MISMATCH: parsed {len(rows)} rows, expected {len(expected)}')
+                continue
+
+            print(f'{name:<26} {impl:<8} {len(rows):>5} {latency * 1000:>13.2f} {len(rows) / latency:>10.0f} {peak / 1024:>11.0f} {baseline / latency:>7.1f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1] if len(sys.argv) > 1 else '')
@@ -0,0 +1,137 @@
+"""
+Generates the HTML fixtures used by bench_parser.py. The pages mimic what Chrome's page_source
+looks like for the two Craigslist search result layouts, including all the surrounding page chrome.
+
+Usage: python benchmarks/make_fixtures.py
+"""
+
+import os, random, html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Number of result rows in each fixture
+SIZES = [25, 120, 360]
+
+WORDS = (
+    'vintage new used mint rare lot set pair working tested desk chair table lamp bike road mountain '
+    'guitar amp speaker laptop monitor keyboard camera lens phone case couch sofa dresser tools drill '
+    'saw kids toys lego collection records vinyl bundle & "quality" <large> small'
+).split()
+
+HOODS = ['san jose', 'oakland', 'palo alto', 'sunnyvale', 'berkeley', 'fremont', 'santa clara']
+
+def title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))).title()
+
+def head(rng, layout):
+    # Styles, scripts and the search form, which make up a big part of the real pages
+    scripts = ''.join(
+        f'<script type="text/javascript">var cl{i} = {{"a": {rng.randint(0, 1 << 30)}, "b": "{"x" * rng.randint(50, 400)}"}};</script>\n'
+        for i in range(30)
+    )
+
+    options = ''.join(f'<option value="{i}">{title(rng)}</option>' for i in range(150))
+    checkboxes = ''.join(
+        f'<li><label><input type="checkbox" name="cat{i}" value="{i}"><span class="checkbox-label">{title(rng)}</span></label></li>'
+        for i in range(120)
+    )
+
+    return (
+        '<!DOCTYPE html><html class="js" lang="en"><head><meta charset="UTF-8">'
+        f'<title>sf bay area for sale - craigslist</title><link rel="stylesheet" href="/styles/{layout}.css">{scripts}</head>'
+        '<body class="search desktop w1024 list">'
+        '<section class="page-container"><header class="global-header"><a class="header-logo" href="/">CL</a>'
+        '<nav class="breadcrumbs-container"><ul class="breadcrumbs"><li class="crumb area"><a href="/">sf bay area</a></li>'
+        '<li class="crumb section"><a href="/search/sss">for sale</a></li></ul></nav></header>'
+        f'<form id="searchform" class="searchform"><div class="search-options"><select name="category">{options}</select>'
+        f'<ul class="search-attributes">{checkboxes}</ul></div></form>'
+    )
+
+def foot(rng):
+    links = ''.join(f'<li><a href="/about/{i}">{title(rng)}</a></li>' for i in range(80))
+    return f'<footer><ul class="clfooter">{links}</ul></footer></section></body></html>'
+
+def row1(rng, id):
+    url = f'https://sfbay.craigslist.org/sby/ele/d/{rng.choice(HOODS).replace(" ", "-")}-item/{id}.html'
+    name = html.escape(title(rng))
+
+    return (
+        f'<li class="result-row" data-pid="{id}">\n'
+        f'<a href="{url}" class="result-image gallery" data-ids="3:00{rng.randint(0, 1 << 40):x}_0CI0t2,3:00{rng.randint(0, 1 << 40):x}_0CI0t2">'
+        f'<span class="result-price">${rng.randint(1, 2000)}</span></a>\n'
+        '<div class="result-info">\n'
+        '<span class="icon icon-star" role="button"><span class="screen-reader-text">favorite this post</span></span>\n'
+        f'<time class="result-date" datetime="2022-09-{rng.randint(1, 28):02} 12:{rng.randint(0, 59):02}" title="Thu 01 Sep 12:00:00 PM">Sep  1</time>\n'
+        f'<h3 class="result-heading"><a href="{url}" data-id="{id}" class="result-title hdrlnk" id="postid_{id}">{name}</a></h3>\n'
+        f'<span class="result-meta"><span class="result-price">${rng.randint(1, 2000)}</span>'
+        f'<span class="result-hood"> ({rng.choice(HOODS)})</span><span class="result-tags"><span class="pictag">pic</span></span>'
+        '<span class="banish icon icon-trash" role="button"><span class="screen-reader-text">hide this posting</span></span>'
+        '<span class="unbanish icon icon-trash red" role="button"></span>'
+        '<a href="#" class="restore-link"><span class="restore-narrow-text">restore</span><span class="restore-wide-text">restore this posting</span></a>'
+        '</span>\n</div>\n</li>\n'
+    )
+
+def row2(rng, id):
+    url = f'https://sfbay.craigslist.org/sby/ele/d/{rng.choice(HOODS).replace(" ", "-")}-item/{id}.html'
+    name = html.escape(title(rng))
+
+    return (
+        f'<li class="cl-search-result cl-search-view-mode-gallery" data-pid="{id}" title="{name}">'
+        '<div class="gallery-card"><div class="cl-gallery"><div class="gallery-inner">'
+        f'<a href="{url}" class="main" tabindex="-1"><div class="swipe"><div class="swipe-wrap">'
+        f'<div data-index="0"><span class="loading"><img alt="{name}" src="https://images.craigslist.org/00{rng.randint(0, 1 << 40):x}_300x300.jpg"></span></div>'
+        '</div></div></a><div class="slider-back-arrow icom-"></div><div class="slider-forward-arrow icom-"></div></div></div>'
+        f'<div class="title-blob"><a href="{url}" class="titlestring">{name}</a></div>'
+        f'<div class="meta">{rng.randint(1, 59)} mins ago<span class="separator">·</span>{rng.choice(HOODS)}</div>'
+        f'<span class="priceinfo">${rng.randint(1, 2000)}</span>'
+        '<button type="button" tabindex="0" class="bd-button cl-favorite-button icon-only"><span class="icon icom-"></span></button>'
+        '</div></li>\n'
+    )
+
+def page1(rng, size, nearby):
+    rows = ''.join(row1(rng, 7500000000 + i) for i in range(size))
+
+    if nearby:
+        rows += '<h4 class="ban nearby"><span class="bantext">Few local results found. Here are some from nearby areas.</span></h4>\n'
+        rows += ''.join(row1(rng, 7600000000 + i) for i in range(size // 4))
+
+    return (
+        head(rng, 'layout1') +
+        '<div class="search-legend"><div class="paginator buttongroup"><span class="buttons">'
+        '<a href="/search/sss?query=test&amp;s=120" class="button next" title="next page">next &gt; </a></span></div></div>'
+        f'<div class="content" id="sortable-results"><ul class="rows" id="search-results">\n{rows}</ul></div>' +
+        foot(rng)
+    )
+
+def page2(rng, size, nearby):
+    rows = ''.join(row2(rng, 7500000000 + i) for i in range(size))
+
+    if nearby:
+        rows += '<li class="nearby-separator">Results from nearby areas</li>\n'
+        rows += ''.join(row2(rng, 7600000000 + i) for i in range(size // 4))
+
+    return (
+        head(rng, 'layout2') +
+        '<div class="cl-search-results"><div class="results cl-results-page" id="search-results-page-1">'
+        f'<ol class="cl-static-search-results">\n{rows}</ol></div></div>'
+        '<div class="cl-search-paginator"><button type="button" class="bd-button cl-next-page icon-only"><span class="icon icom-"></span></button></div>' +
+        foot(rng)
+    )
+
+def main():
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+
+    for layout, generate in [(1, page1), (2, page2)]:
+        for size in SIZES:
+            for nearby in [False, True]:
+                # Seed each fixture separately so that they don't change when new ones are added
+                rng = random.Random(f'{layout}-{size}-{nearby}')
+
+                name = f'layout{layout}-{size}{"-nearby" if nearby else ""}.html'
+                with open(os.path.join(FIXTURES_DIR, name), 'w', encoding='utf-8') as f:
+                    f.write(generate(rng, size, nearby))
+
+                print(f'Generated {name}')
+
+if __name__ == '__main__':
+    main()
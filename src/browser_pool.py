@@ -0,0 +1,171 @@
+import threading, queue, logging, time
+
+class BrowserPool:
+    """
+    Keeps a number of warm browser sessions around, so that crawler threads can check one out per
+    query without waiting for Chrome to start. Sessions are health-checked when they are returned,
+    and dead ones (or ones that the supervisor wants recycled) are thrown away and replaced in the background.
+    """
+
+    def __init__(self, size, factory, timeout=120, supervisor=None, interrupted=None, retry_secs=60):
+        self.size = size
+        self.factory = factory
+        self.timeout = timeout
+        self.supervisor = supervisor
+        self.interrupted = interrupted or (lambda: False)
+
+        # How long to wait after a session failed to start before trying again
+        self.retry_secs = retry_secs
+
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.count = 0
+        self.closed = False
+
+        # Why the last session failed to start, and when
+        self.error = None
+        self.error_time = 0
+
+    def warm(self):
+        """
+        Starts up sessions in the background until the pool is full
+        """
+
+        with self.lock:
+            # Don't keep trying to start sessions right after one failed
+            if self.closed or (self.error != None and time.monotonic() - self.error_time < self.retry_secs):
+                return
+
+            missing = max(self.size - self.count, 0)
+            self.count += missing
+
+        for _ in range(missing):
+            self.spawn()
+
+    def spawn(self):
+        # Start the session on it's own thread, as it can take a while
+        threading.Thread(target=self.start_session, name='BrowserPool', daemon=True).start()
+
+    def start_session(self):
+        try:
+            session = self.factory()
+        except Exception as e:
+            logging.exception(f'Failed to start browser session: {e}')
+
+            with self.lock:
+                self.count -= 1
+                self.error = e
+                self.error_time = time.monotonic()
+
+            return
+
+        if self.supervisor != None:
+            self.supervisor.track(session)
+
+        with self.lock:
+            self.error = None
+
+        # The pool might have been closed while we were starting up
+        if not self.put_idle(session):
+            self.discard(session)
+
+    def put_idle(self, session):
+        """
+        Makes a session available to be checked out, returning False if the pool has been closed
+        """
+
+        # Check and put under the lock, so that close() can't miss the session
+        with self.lock:
+            if self.closed:
+                return False
+
+            self.idle.put(session)
+            return True
+
+    def checkout(self):
+        """
+        Grabs an idle session, waiting for one to become available if needed
+        """
+
+        if self.closed:
+            raise Exception('The browser pool is closed')
+
+        # Make sure that the pool is full, in case any sessions failed to start
+        self.warm()
+
+        deadline = time.monotonic() + self.timeout
+
+        # Wait in short slices, so that we can give up as soon as there's no point in waiting any longer
+        while True:
+            try:
+                return self.idle.get(timeout=0.25)
+            except queue.Empty:
+                pass
+
+            if self.closed:
+                raise Exception('The browser pool is closed')
+
+            if self.interrupted():
+                raise Exception('Interrupted while waiting for a browser session')
+
+            # No session is going to show up if none are running, busy or starting, so don't wait for one
+            with self.lock:
+                if self.count == 0 and self.error != None:
+                    raise Exception(f'Unable to start a browser session: {self.error}')
+
+            if time.monotonic() >= deadline:
+                raise Exception(f'Timed out waiting for a browser session after {self.timeout} seconds')
+
+    def checkin(self, session):
+        """
+        Returns a session to the pool, replacing it if it's no longer working
+        """
+
+        if self.closed:
+            self.discard(session)
+            return
+
+        if not session.is_alive():
+            logging.warning('Replacing dead browser session')
+        elif self.supervisor == None or self.supervisor.retire(session) == None:
+            if not self.put_idle(session):
+                self.discard(session)
+
+            return
+
+        self.discard(session)
+        self.warm()
+
+    def discard(self, session):
+        """
+        Shuts down a session and frees up it's spot in the pool
+        """
+
+        with self.lock:
+            self.count -= 1
+
+        # Make sure that the browser doesn't get leaked, even if it's already dead
+        try:
+            session.close()
+        except Exception as e:
+            logging.error(f'Failed to shut down browser session: {e}')
+
+        # Don't leave any of it's processes behind, even if the driver died without taking Chrome down with it
+        if self.supervisor != None:
+            self.supervisor.release(session)
+
+    def close(self):
+        """
+        Shuts down all of the idle sessions
+        """
+
+        with self.lock:
+            self.closed = True
+
+        while True:
+            try:
+                session = self.idle.get_nowait()
+            except queue.Empty:
+                break
+
+            self.discard(session)
@@ -1,12 +1,18 @@
-import sys, os, json, base64, logging
+from startup import startup
+
+import sys, os, json, base64, logging, argparse
+
+from config import config
+startup.mark('config')
+
 from PyQt5.QtWidgets import *
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtGui import QPalette, QColor
 
-from config import config
 from gui import Main
+startup.mark('imports')
 
-def main():
+def main(args):
     # Create the main Qt application
     app = QApplication([])
     app.setQuitOnLastWindowClosed(False)
@@ -34,10 +40,19 @@ def main():
     app.setPalette(dark_palette)
 
     # Create the main window and run the program!
-    window = Main(app, 'autostart' in sys.argv)
+    window = Main(app, args.mode == 'autostart', args.record, args.profile)
+
+    # Report how long starting up took once the event loop is running, which is when the window first gets drawn
+    QTimer.singleShot(0, lambda: startup.report('Startup (autostart)' if args.mode == 'autostart' else 'Startup'))
     app.exec()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', nargs='?', choices=['autostart'], help='start hidden in the system tray')
+    parser.add_argument('--record', metavar='PATH', help='record every page that gets visited into an archive for replay.py')
+    parser.add_argument('--profile', metavar='CYCLES', type=int, default=0, help='profile the first number of update cycles into the AppData directory')
+    args = parser.parse_args()
+
     # Setup logging
     log_path = os.path.join(config.appdata, 'debug.log')
 
@@ -51,7 +66,7 @@ if __name__ == '__main__':
     )
 
     try:
-        main()
+        main(args)
     except Exception as e:
         logging.exception('Program completed crashed: ', e)
     else:
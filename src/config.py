@@ -2,8 +2,8 @@ import json, os
 
 class Config:
     def __init__(self):    
-        # Find the AppData path
-        self.appdata = os.path.join(os.getenv('LOCALAPPDATA'), 'CL-Checker')
+        # Find the AppData path, falling back to the user's data directory when not on Windows
+        self.appdata = os.path.join(os.getenv('LOCALAPPDATA') or os.path.expanduser('~/.local/share'), 'CL-Checker')
         
         # Setup the default config values
         self.db_path = os.path.join(self.appdata, 'checker.db')
@@ -12,12 +12,43 @@ class Config:
         self.from_email = ''
         self.from_password = ''
         self.to_email = ''
+        self.max_workers = 4
+        self.host_rate = 1.0
+        self.host_burst = 2
+        self.browser_pool_size = 2
+        self.browser_max_mb = 1024
+        self.browser_max_pages = 500
+        self.incremental = True
+        self.incremental_stop_rows = 0
+        self.full_crawl_secs = 6 * 60 * 60
+        self.page_timeout = 10
+        self.schedule_min_secs = 60
+        self.schedule_max_secs = 60 * 60
+        self.fetch_budget = 720
+        self.seen_index_mb = 64
+        self.seen_index_bloom_min = 1000000
+        self.smtp_host = 'smtp.gmail.com'
+        self.smtp_port = 465
+        self.smtp_ssl = True
+        self.smtp_starttls = False
+        self.email_merge_secs = 30
+        self.email_retries = 5
+        self.email_backoff_secs = 10
+        self.email_max_backoff_secs = 5 * 60
+        self.email_max_per_query = 50
+        self.email_max_bytes = 90000
+        self.metrics_port = 0
+        self.retention_days = 7
+        self.retention_batch_size = 500
+        self.retention_max_batches = 20
+        self.retention_archive = False
+        self.metrics_history = 100
         
         # Make sure the the AppData directory exists
         if not os.path.isdir(self.appdata):
             try:
                 print('Creating AppData directory...')
-                os.mkdir(self.appdata)
+                os.makedirs(self.appdata)
             except:
                 print(f'Unable to create directory {self.appdata}')
                 exit(1)
@@ -45,6 +76,39 @@ class Config:
         self.from_password = data['from_password']
         self.to_email = data['to_email']
 
+        # Newer settings might be missing from older configs
+        self.max_workers = data.get('max_workers', self.max_workers)
+        self.host_rate = data.get('host_rate', self.host_rate)
+        self.host_burst = data.get('host_burst', self.host_burst)
+        self.browser_pool_size = data.get('browser_pool_size', self.browser_pool_size)
+        self.browser_max_mb = data.get('browser_max_mb', self.browser_max_mb)
+        self.browser_max_pages = data.get('browser_max_pages', self.browser_max_pages)
+        self.incremental = data.get('incremental', self.incremental)
+        self.incremental_stop_rows = data.get('incremental_stop_rows', self.incremental_stop_rows)
+        self.full_crawl_secs = data.get('full_crawl_secs', self.full_crawl_secs)
+        self.page_timeout = data.get('page_timeout', self.page_timeout)
+        self.schedule_min_secs = data.get('schedule_min_secs', self.schedule_min_secs)
+        self.schedule_max_secs = data.get('schedule_max_secs', self.schedule_max_secs)
+        self.fetch_budget = data.get('fetch_budget', self.fetch_budget)
+        self.seen_index_mb = data.get('seen_index_mb', self.seen_index_mb)
+        self.seen_index_bloom_min = data.get('seen_index_bloom_min', self.seen_index_bloom_min)
+        self.smtp_host = data.get('smtp_host', self.smtp_host)
+        self.smtp_port = data.get('smtp_port', self.smtp_port)
+        self.smtp_ssl = data.get('smtp_ssl', self.smtp_ssl)
+        self.smtp_starttls = data.get('smtp_starttls', self.smtp_starttls)
+        self.email_merge_secs = data.get('email_merge_secs', self.email_merge_secs)
+        self.email_retries = data.get('email_retries', self.email_retries)
+        self.email_backoff_secs = data.get('email_backoff_secs', self.email_backoff_secs)
+        self.email_max_backoff_secs = data.get('email_max_backoff_secs', self.email_max_backoff_secs)
+        self.email_max_per_query = data.get('email_max_per_query', self.email_max_per_query)
+        self.email_max_bytes = data.get('email_max_bytes', self.email_max_bytes)
+        self.metrics_port = data.get('metrics_port', self.metrics_port)
+        self.metrics_history = data.get('metrics_history', self.metrics_history)
+        self.retention_days = data.get('retention_days', self.retention_days)
+        self.retention_batch_size = data.get('retention_batch_size', self.retention_batch_size)
+        self.retention_max_batches = data.get('retention_max_batches', self.retention_max_batches)
+        self.retention_archive = data.get('retention_archive', self.retention_archive)
+
     def save(self):    
         data = {
             'db_path': self.db_path,
@@ -53,6 +117,37 @@ class Config:
             'from_email': self.from_email,
             'from_password': self.from_password,
             'to_email': self.to_email,
+            'max_workers': self.max_workers,
+            'host_rate': self.host_rate,
+            'host_burst': self.host_burst,
+            'browser_pool_size': self.browser_pool_size,
+            'browser_max_mb': self.browser_max_mb,
+            'browser_max_pages': self.browser_max_pages,
+            'incremental': self.incremental,
+            'incremental_stop_rows': self.incremental_stop_rows,
+            'full_crawl_secs': self.full_crawl_secs,
+            'page_timeout': self.page_timeout,
+            'schedule_min_secs': self.schedule_min_secs,
+            'schedule_max_secs': self.schedule_max_secs,
+            'fetch_budget': self.fetch_budget,
+            'seen_index_mb': self.seen_index_mb,
+            'seen_index_bloom_min': self.seen_index_bloom_min,
+            'smtp_host': self.smtp_host,
+            'smtp_port': self.smtp_port,
+            'smtp_ssl': self.smtp_ssl,
+            'smtp_starttls': self.smtp_starttls,
+            'email_merge_secs': self.email_merge_secs,
+            'email_retries': self.email_retries,
+            'email_backoff_secs': self.email_backoff_secs,
+            'email_max_backoff_secs': self.email_max_backoff_secs,
+            'email_max_per_query': self.email_max_per_query,
+            'email_max_bytes': self.email_max_bytes,
+            'metrics_port': self.metrics_port,
+            'metrics_history': self.metrics_history,
+            'retention_days': self.retention_days,
+            'retention_batch_size': self.retention_batch_size,
+            'retention_max_batches': self.retention_max_batches,
+            'retention_archive': self.retention_archive,
         }
 
         # Write the config data to a JSON file
@@ -0,0 +1,62 @@
+import sqlite3, threading, logging
+
+class ConnectionManager:
+    """
+    Hands out a cached SQLite connection per thread and database path, so that the GUI and
+    the updater thread each reuse their own connection instead of opening a new one every time.
+    """
+
+    def __init__(self, busy_timeout=30, cached_statements=256):
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.local = threading.local()
+
+    def get(self, path):
+        """
+        Grabs the current thread's connection to a database, opening it if needed
+        """
+
+        connections = self.connections()
+
+        conn = connections.get(path)
+        if conn != None:
+            return conn
+
+        conn = sqlite3.connect(
+            path,
+            timeout=self.busy_timeout,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            cached_statements=self.cached_statements
+        )
+
+        # Use write-ahead logging so that readers never wait on the writer (and vice versa),
+        # and only sync at checkpoints, which is still safe in WAL mode
+        conn.execute('PRAGMA journal_mode = WAL;')
+        conn.execute('PRAGMA synchronous = NORMAL;')
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout * 1000)};')
+
+        logging.debug(f'Opened connection to {path} on thread {threading.current_thread().name}')
+
+        connections[path] = conn
+        return conn
+
+    def close(self):
+        """
+        Closes all of the current thread's connections. Should be called before a thread exits.
+        """
+
+        connections = self.connections()
+
+        for conn in connections.values():
+            conn.close()
+
+        connections.clear()
+
+    def connections(self):
+        # Get the connections belonging to the current thread
+        if not hasattr(self.local, 'connections'):
+            self.local.connections = {}
+
+        return self.local.connections
+
+connections = ConnectionManager()
@@ -0,0 +1,141 @@
+"""
+Runs the checker headless, without Qt or a display, sharing the same config and database as the GUI.
+
+Usage:
+    python -m daemon           keep updating the queries as they come due
+    python -m daemon --once    update all of the queries once and exit, e.g. from cron
+"""
+
+from startup import startup
+
+import argparse, logging, signal, sys, threading
+
+from config import config
+from db import DB
+from engine import Engine
+from notifier import Notifier
+from recorder import Recorder
+startup.mark('imports')
+
+class Daemon:
+    """
+    Drives the engine and the notifier on a schedule, like the GUI does
+    """
+
+    def __init__(self, record_path=None):
+        self.engine = Engine(Recorder(record_path) if record_path else None)
+        self.scheduler = self.engine.scheduler
+        self.notifier = Notifier(self.email_finished)
+        self.stopping = threading.Event()
+
+    def stop(self):
+        self.stopping.set()
+        self.engine.request_stop()
+
+    def email_finished(self, ok, message):
+        if ok:
+            logging.info(message)
+        else:
+            logging.error(message)
+
+    def update(self, due=None):
+        """
+        Runs a single update of the due queries (all of them if None), returning the products to email
+        """
+
+        self.engine.due = due
+        self.engine.run()
+
+        # The run closed this thread's connection, so reopen it
+        db = DB(config.db_path)
+
+        total_found = sum(len(products) for products in self.engine.total_products.values())
+        failed = sum(1 for status in self.engine.query_statuses.values() if status != 'ok')
+        logging.info(f'Updated {len(self.engine.query_statuses)} queries ({failed} failed), found {total_found} new products')
+
+        return self.engine.email_products(db)
+
+    def run_once(self):
+        """
+        Updates all of the queries and sends the email right away, returning whether everything went ok
+        """
+
+        email_products = self.update()
+        ok = self.engine.status == 'ok'
+
+        if email_products and not self.stopping.is_set():
+            ok = self.notifier.deliver(email_products) and ok
+
+        self.notifier.stop()
+        return ok
+
+    def run_loop(self):
+        """
+        Keeps updating the queries as they come due, until stopped
+        """
+
+        self.notifier.start()
+
+        while not self.stopping.is_set():
+            # Keep the schedule up to date with any changes to the queries
+            self.scheduler.base_secs = config.update_secs
+            self.scheduler.sync(DB(config.db_path).get_queries())
+            wait = self.scheduler.seconds_until_due()
+
+            # Check back every so often, as queries might get added from the GUI
+            if wait == None or wait > 0:
+                self.stopping.wait(min(wait or 60, 60))
+                continue
+
+            # Grab the due queries, as far as the fetch budget allows
+            due = self.scheduler.take_due()
+            if not due:
+                self.stopping.wait(5)
+                continue
+
+            email_products = self.update(due)
+            if email_products:
+                self.notifier.submit(email_products)
+
+        self.notifier.stop(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs the checker headless, without the GUI')
+    parser.add_argument('--once', action='store_true', help='update all of the queries once and exit')
+    parser.add_argument('--record', metavar='PATH', help='record every page that gets visited into an archive for replay.py')
+    parser.add_argument('--profile', metavar='CYCLES', type=int, default=0, help='profile the first number of update cycles into the AppData directory')
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], help='(default: %(default)s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level = args.log_level,
+        format = '%(asctime)s [%(levelname)s] %(message)s',
+        handlers = [
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    daemon = Daemon(args.record)
+
+    if args.profile > 0:
+        daemon.engine.profiler.arm(args.profile)
+    startup.mark('engine')
+    startup.report('Daemon startup')
+
+    # Finish up cleanly when asked to stop
+    signal.signal(signal.SIGINT, lambda signum, frame: daemon.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop())
+
+    try:
+        if args.once:
+            ok = daemon.run_once()
+        else:
+            daemon.run_loop()
+            ok = True
+    finally:
+        daemon.engine.close()
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
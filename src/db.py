@@ -1,4 +1,7 @@
-import sqlite3, os, urllib.parse
+import urllib.parse, itertools, logging
+
+from connection import connections
+from seen_index import seen_indexes
 
 class Query:
     def __init__(self, area, section, query, alarm, email, id=-1):
@@ -68,50 +71,145 @@ class Query:
     }
 
 class Product:
-    def __init__(self, id, name, url, query):
+    def __init__(self, id, name, url, query, found=None, seen=None):
         self.id = id
         self.name = name
         self.url = url
         self.query = query
+        self.found = found
+        self.seen = seen
+
+# Schema migrations, where the database's user_version is the number of them that have been applied
+migrations = [
+    # 1: Initial tables
+    [
+        '''CREATE TABLE IF NOT EXISTS PRODUCTS
+           (ID    INT       NOT NULL PRIMARY KEY,
+            NAME  TEXT      NOT NULL,
+            URL   TEXT      NOT NULL,
+            QUERY TEXT      NOT NULL,
+            FOUND TIMESTAMP NOT NULL,
+            SEEN  TIMESTAMP NOT NULL
+           );''',
+
+        '''CREATE TABLE IF NOT EXISTS QUERIES
+           (ID      INTEGER  PRIMARY KEY,
+            AREA    TEXT NOT NULL,
+            SECTION TEXT NOT NULL,
+            QUERY   TEXT NOT NULL,
+            ALARM   INT  NOT NULL,
+            EMAIL   INT  NOT NULL
+           );''',
+    ],
+
+    # 2: Indexes for the per-query count/list lookups and the SEEN based clean up
+    [
+        'CREATE INDEX IF NOT EXISTS PRODUCTS_QUERY_FOUND ON PRODUCTS (QUERY, FOUND);',
+        'CREATE INDEX IF NOT EXISTS PRODUCTS_SEEN ON PRODUCTS (SEEN);',
+    ],
+
+    # 3: Map products to every query that found them, instead of just the first one
+    [
+        '''CREATE TABLE IF NOT EXISTS PRODUCT_QUERIES
+           (QUERY TEXT      NOT NULL,
+            ID    INT       NOT NULL,
+            FOUND TIMESTAMP NOT NULL,
+            SEEN  TIMESTAMP NOT NULL,
+            PRIMARY KEY (QUERY, ID)
+           ) WITHOUT ROWID;''',
+
+        'INSERT OR IGNORE INTO PRODUCT_QUERIES (QUERY, ID, FOUND, SEEN) SELECT QUERY, ID, FOUND, SEEN FROM PRODUCTS;',
+        'CREATE INDEX IF NOT EXISTS PRODUCT_QUERIES_QUERY_FOUND ON PRODUCT_QUERIES (QUERY, FOUND);',
+        'CREATE INDEX IF NOT EXISTS PRODUCT_QUERIES_SEEN ON PRODUCT_QUERIES (SEEN);',
+
+        # PRODUCTS.QUERY is now just the query that found the product first, so it doesn't need an index anymore
+        'DROP INDEX IF EXISTS PRODUCTS_QUERY_FOUND;',
+    ],
+
+    # 4: Index for paging through a query's products by when they were last seen
+    [
+        'CREATE INDEX IF NOT EXISTS PRODUCT_QUERIES_QUERY_SEEN ON PRODUCT_QUERIES (QUERY, SEEN);',
+    ],
+
+    # 5: Full-text index of the product names, kept in sync with PRODUCTS by triggers
+    [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS PRODUCTS_FTS USING fts5
+           (NAME, content='PRODUCTS', content_rowid='ID');''',
+
+        '''CREATE TRIGGER IF NOT EXISTS PRODUCTS_FTS_INSERT AFTER INSERT ON PRODUCTS BEGIN
+               INSERT INTO PRODUCTS_FTS (rowid, NAME) VALUES (new.ID, new.NAME);
+           END;''',
+
+        '''CREATE TRIGGER IF NOT EXISTS PRODUCTS_FTS_DELETE AFTER DELETE ON PRODUCTS BEGIN
+               INSERT INTO PRODUCTS_FTS (PRODUCTS_FTS, rowid, NAME) VALUES ('delete', old.ID, old.NAME);
+           END;''',
+
+        '''CREATE TRIGGER IF NOT EXISTS PRODUCTS_FTS_UPDATE AFTER UPDATE OF ID, NAME ON PRODUCTS BEGIN
+               INSERT INTO PRODUCTS_FTS (PRODUCTS_FTS, rowid, NAME) VALUES ('delete', old.ID, old.NAME);
+               INSERT INTO PRODUCTS_FTS (rowid, NAME) VALUES (new.ID, new.NAME);
+           END;''',
+
+        # Index all of the existing products
+        "INSERT INTO PRODUCTS_FTS (PRODUCTS_FTS) VALUES ('rebuild');",
+    ],
+
+    # 6: When each query URL last had all of it's pages crawled, so that it survives restarts
+    [
+        '''CREATE TABLE IF NOT EXISTS FULL_CRAWLS
+           (QUERY TEXT NOT NULL PRIMARY KEY,
+            TIME  REAL NOT NULL
+           ) WITHOUT ROWID;''',
+    ],
+
+    # 7: Counts how many times products have been expired, so that other processes can tell when their seen indexes are stale
+    [
+        '''CREATE TABLE IF NOT EXISTS COUNTERS
+           (NAME  TEXT NOT NULL PRIMARY KEY,
+            VALUE INT  NOT NULL
+           ) WITHOUT ROWID;''',
+
+        'INSERT OR IGNORE INTO COUNTERS (NAME, VALUE) VALUES("expired", 0);',
+    ],
+]
 
 class DB:
     """
     Connivent wrapper around SQLite for storing all the different product information.
     """
 
-    def __init__(self, path):
-        exists = os.path.exists(path)
-
-        try:
-            self.conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES)
-        except:
-            pass # TODO
-
-        # Initial Setup
-        if not exists:
-            self.conn.execute('''
-                CREATE TABLE PRODUCTS
-                (ID    INT       NOT NULL PRIMARY KEY,
-                 NAME  TEXT      NOT NULL,
-                 URL   TEXT      NOT NULL,
-                 QUERY TEXT      NOT NULL,
-                 FOUND TIMESTAMP NOT NULL,
-                 SEEN  TIMESTAMP NOT NULL
-                );''')
-
-            self.conn.execute('''
-                CREATE TABLE QUERIES
-                (ID      INTEGER  PRIMARY KEY,
-                 AREA    TEXT NOT NULL,
-                 SECTION TEXT NOT NULL,
-                 QUERY   TEXT NOT NULL,
-                 ALARM   INT  NOT NULL,
-                 EMAIL   INT  NOT NULL
-                );''')
-
-            self.conn.commit()
-            print('Created empty database')
-            
+    # Maximum number of bound variables used in a single statement
+    max_variables = 500
+
+    def __init__(self, path, version=None):
+        # Reuse this thread's connection to the database
+        self.path = path
+        self.conn = connections.get(path)
+
+        # Make sure that the schema is up to date
+        self.migrate(version)
+
+    def migrate(self, version=None):
+        """
+        Upgrades the database schema in place to the given version (the latest by default),
+        using SQLite's user_version to keep track of which migrations were already applied
+        """
+
+        if version == None:
+            version = len(migrations)
+
+        current = self.conn.execute('PRAGMA user_version;').fetchone()[0]
+
+        # Apply each pending migration in it's own transaction
+        while current < version:
+            with self.conn:
+                for statement in migrations[current]:
+                    self.conn.execute(statement)
+
+                current += 1
+                self.conn.execute(f'PRAGMA user_version = {current};')
+
+            logging.info(f'Migrated database to version {current}')
+
     def get_queries(self):
         """
         Gets a list of all queries
@@ -174,6 +272,27 @@ class DB:
         self.conn.execute('DELETE FROM QUERIES WHERE ID = ?;', [id])
         self.conn.commit()
         
+    def get_full_crawl(self, query_url):
+        """
+        Grabs when a query URL last had all of it's pages crawled, as a Unix timestamp, or 0 if it never has
+        """
+
+        cursor = self.conn.execute('SELECT TIME FROM FULL_CRAWLS WHERE QUERY = ?;', [query_url])
+
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def set_full_crawl(self, query_url, time):
+        """
+        Records when a query URL last had all of it's pages crawled
+        """
+
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO FULL_CRAWLS (QUERY, TIME) VALUES(?, ?) ON CONFLICT(QUERY) DO UPDATE SET TIME = excluded.TIME;',
+                [query_url, time]
+            )
+
     def get_product(self, product):
         """
         Grabs a product by it's ID, returning None if it does not exist
@@ -192,7 +311,12 @@ class DB:
         Grabs a list of all products that were found using a query URL
         """
         
-        cursor = self.conn.execute('SELECT * FROM PRODUCTS WHERE QUERY = ? ORDER BY FOUND;', [query_url])
+        cursor = self.conn.execute(
+            '''SELECT PRODUCTS.ID, PRODUCTS.NAME, PRODUCTS.URL, PRODUCT_QUERIES.QUERY FROM PRODUCT_QUERIES
+               JOIN PRODUCTS ON PRODUCTS.ID = PRODUCT_QUERIES.ID
+               WHERE PRODUCT_QUERIES.QUERY = ? ORDER BY PRODUCT_QUERIES.FOUND;''',
+            [query_url]
+        )
         products = []
 
         for row in cursor:
@@ -200,36 +324,229 @@ class DB:
 
         return products
 
+    def get_products_page(self, query_url, order='found', descending=False, after=None, limit=200):
+        """
+        Grabs a page of the products that were found using a query URL, sorted by when they were found or last seen.
+        Pages are fetched by keyset, continuing after the (sort key, ID) of the last product of the previous page,
+        so every page costs the same no matter how far into the list it is.
+        """
+
+        column = {'found': 'FOUND', 'seen': 'SEEN'}[order]
+        direction = 'DESC' if descending else 'ASC'
+
+        where = 'PRODUCT_QUERIES.QUERY = ?'
+        params = [query_url]
+
+        if after != None:
+            where += f' AND (PRODUCT_QUERIES.{column}, PRODUCT_QUERIES.ID) {"<" if descending else ">"} (?, ?)'
+            params += [str(after[0]), after[1]]
+
+        cursor = self.conn.execute(
+            f'''SELECT PRODUCTS.ID, PRODUCTS.NAME, PRODUCTS.URL, PRODUCT_QUERIES.QUERY, PRODUCT_QUERIES.FOUND, PRODUCT_QUERIES.SEEN
+                FROM PRODUCT_QUERIES JOIN PRODUCTS ON PRODUCTS.ID = PRODUCT_QUERIES.ID
+                WHERE {where}
+                ORDER BY PRODUCT_QUERIES.{column} {direction}, PRODUCT_QUERIES.ID {direction} LIMIT ?;''',
+            params + [limit]
+        )
+
+        return [Product(*row) for row in cursor]
+
     def get_num_products(self, query_url):
         """
         Grabs the number of products that were found using a query URL
         """
 
-        cursor = self.conn.execute('SELECT COUNT(ID) FROM PRODUCTS WHERE QUERY = ?;', [query_url])
+        cursor = self.conn.execute('SELECT COUNT(ID) FROM PRODUCT_QUERIES WHERE QUERY = ?;', [query_url])
         return cursor.fetchone()[0]
 
+    def search_products(self, text, limit=100):
+        """
+        Searches the names of all the stored products, returning the best matches first.
+        Every word has to match, and the last one can be the start of a word, so that it works while typing.
+        """
+
+        words = text.split()
+        if not words:
+            return []
+
+        # Quote each word, so that nothing in the text gets treated as FTS syntax
+        match = ' '.join('"' + word.replace('"', '""') + '"' for word in words) + '*'
+
+        cursor = self.conn.execute(
+            '''SELECT PRODUCTS.ID, PRODUCTS.NAME, PRODUCTS.URL, PRODUCTS.QUERY, PRODUCTS.FOUND, PRODUCTS.SEEN
+               FROM PRODUCTS_FTS JOIN PRODUCTS ON PRODUCTS.ID = PRODUCTS_FTS.rowid
+               WHERE PRODUCTS_FTS MATCH ? ORDER BY PRODUCTS_FTS.rank LIMIT ?;''',
+            [match, limit]
+        )
+
+        return [Product(*row) for row in cursor]
+
+    def get_product_counts(self, query_urls):
+        """
+        Grabs the number of products that were found by each of a list of query URLs, in a single query
+        """
+
+        counts = {url: 0 for url in query_urls}
+        urls = list(counts.keys())
+
+        # In chunks to stay under SQLite's variable limit
+        for i in range(0, len(urls), DB.max_variables):
+            chunk = urls[i:i + DB.max_variables]
+            cursor = self.conn.execute(
+                f'SELECT QUERY, COUNT(ID) FROM PRODUCT_QUERIES WHERE QUERY IN ({",".join("?" * len(chunk))}) GROUP BY QUERY;',
+                chunk
+            )
+
+            counts.update(cursor.fetchall())
+
+        return counts
+
     def add_product(self, product):
         """
         Adds a product to the database, or updates it if it already exists
         """
         
-        cursor = self.conn.execute('SELECT * FROM PRODUCTS WHERE ID = ?', [product.id])
-        
-        # First check if the product already exists in the database
-        if cursor.fetchone() != None:
-            self.conn.execute('UPDATE PRODUCTS SET SEEN = datetime("now") WHERE ID = ?', [product.id])
-        else:
-            self.conn.execute(
-                'INSERT INTO PRODUCTS (ID, NAME, URL, QUERY, FOUND, SEEN) VALUES(?, ?, ?, ?, datetime("now"), datetime("now"));',
-                [product.id, product.name, product.url, product.query]
+        self.upsert_products([product])
+
+    def upsert_products(self, products):
+        """
+        Adds or updates a batch of products in a single transaction, returning the
+        set of IDs that their queries had not found before
+        """
+
+        # Get rid of any duplicate products, keeping the first occurrence, and split them up by query
+        batch = {}
+        for product in products:
+            batch.setdefault(product.query, {}).setdefault(str(product.id), product)
+
+        if not batch:
+            return set()
+
+        with self.conn:
+            # Take the write lock up front, so that other crawler threads (or processes) can't change things between the lookup and the write
+            self.conn.execute('BEGIN IMMEDIATE;')
+
+            # Products that the in-memory index knows about don't need to be looked up. (It can only be used with numeric IDs)
+            index = self.seen_index()
+            if index != None and not all(id.isdigit() for query_batch in batch.values() for id in query_batch):
+                index = None
+
+            existing = {}
+            for query, query_batch in batch.items():
+                existing[query] = set()
+
+                if index != None:
+                    query_index = index.get(query)
+                    existing[query].update(id for id in query_batch if query_index.contains(int(id)))
+
+            for query, query_batch in batch.items():
+                lookup = [id for id in query_batch if id not in existing[query]]
+
+                # Make sure that the rest are really new, in chunks to stay under SQLite's variable limit
+                for i in range(0, len(lookup), DB.max_variables):
+                    chunk = lookup[i:i + DB.max_variables]
+                    cursor = self.conn.execute(
+                        f'SELECT ID FROM PRODUCT_QUERIES WHERE QUERY = ? AND ID IN ({",".join("?" * len(chunk))});',
+                        [query] + chunk
+                    )
+                    existing[query].update(str(row[0]) for row in cursor)
+
+            rows = [(product.id, product.name, product.url, product.query) for query_batch in batch.values() for product in query_batch.values()]
+
+            # Insert the new products and mark the old ones as seen
+            self.conn.executemany(
+                '''INSERT INTO PRODUCTS (ID, NAME, URL, QUERY, FOUND, SEEN) VALUES(?, ?, ?, ?, datetime("now"), datetime("now"))
+                   ON CONFLICT(ID) DO UPDATE SET SEEN = excluded.SEEN;''',
+                rows
             )
 
-        self.conn.commit()
+            # Along with which queries found them
+            self.conn.executemany(
+                '''INSERT INTO PRODUCT_QUERIES (QUERY, ID, FOUND, SEEN) VALUES(?, ?, datetime("now"), datetime("now"))
+                   ON CONFLICT(QUERY, ID) DO UPDATE SET SEEN = excluded.SEEN;''',
+                [(query, id) for id, name, url, query in rows]
+            )
 
-    def delete_old_products(self):
+        new_ids = set()
+
+        for query, query_batch in batch.items():
+            new = [id for id in query_batch if id not in existing[query]]
+
+            if index != None:
+                index.get(query).add(int(id) for id in new)
+
+            new_ids.update(query_batch[id].id for id in new)
+
+        return new_ids
+
+    def expire_products(self, days, limit, archive=None):
         """
-        Deletes any old products from the database that were last seen over a week ago
+        Deletes a batch of up to `limit` of the oldest rows that were last seen over the given number of days ago,
+        writing them to the archive first if there is one, and returns how many were deleted. The query mappings
+        go first, as products get marked as seen along with their queries, so that none of them can outlive their product.
         """
-        
-        self.conn.execute('DELETE FROM PRODUCTS WHERE datetime("now") >= datetime(SEEN, "+7 days");')
-        self.conn.commit()
+
+        cutoff = f'-{days} days'
+        mappings = []
+
+        with self.conn:
+            self.conn.execute('BEGIN IMMEDIATE;')
+            index = self.seen_index()
+
+            # Walk the SEEN indexes from the oldest end, so only the rows that are deleted get looked at
+            mappings = self.conn.execute(
+                'SELECT QUERY, ID, FOUND, SEEN FROM PRODUCT_QUERIES WHERE SEEN <= datetime("now", ?) ORDER BY SEEN LIMIT ?;',
+                (cutoff, limit)
+            ).fetchall()
+
+            if mappings:
+                if archive != None:
+                    archive.write({'table': 'PRODUCT_QUERIES', 'query': query, 'id': id, 'found': found, 'seen': seen} for query, id, found, seen in mappings)
+
+                self.conn.executemany('DELETE FROM PRODUCT_QUERIES WHERE QUERY = ? AND ID = ?;', [(query, id) for query, id, found, seen in mappings])
+                deleted = len(mappings)
+
+            else:
+                products = self.conn.execute(
+                    'SELECT ID, NAME, URL, QUERY, FOUND, SEEN FROM PRODUCTS WHERE SEEN <= datetime("now", ?) ORDER BY SEEN LIMIT ?;',
+                    (cutoff, limit)
+                ).fetchall()
+
+                if products and archive != None:
+                    archive.write({'table': 'PRODUCTS', 'id': id, 'name': name, 'url': url, 'query': query, 'found': found, 'seen': seen} for id, name, url, query, found, seen in products)
+
+                self.conn.executemany('DELETE FROM PRODUCTS WHERE ID = ?;', [(product[0],) for product in products])
+                deleted = len(products)
+
+            # Let the other processes know that their indexes might now have products that no longer exist
+            if mappings:
+                self.conn.execute('UPDATE COUNTERS SET VALUE = VALUE + 1 WHERE NAME = "expired";')
+
+            # Drop the deleted mappings from this process's indexes, before any other thread can look at them
+            if index != None and mappings:
+                index.generation += 1
+
+                for query, rows in itertools.groupby(sorted(mappings, key=lambda row: row[0]), key=lambda row: row[0]):
+                    index.get(query).remove(row[1] for row in rows if isinstance(row[1], int))
+
+        return deleted
+
+    def seen_index(self):
+        """
+        Grabs the in-memory index of the products that each query has found, reloading it if another process
+        has expired any products since it was loaded, as it would still think that they exist. Must be called
+        with the write lock held, so that nothing can get expired in between.
+        """
+
+        index = seen_indexes.get(self.path, self.conn)
+        if index == None:
+            return None
+
+        generation = self.conn.execute('SELECT VALUE FROM COUNTERS WHERE NAME = "expired";').fetchone()[0]
+        if generation != index.generation:
+            logging.info('Products were expired by another process, reloading the seen index')
+
+            seen_indexes.invalidate(self.path)
+            index = seen_indexes.get(self.path, self.conn)
+
+        return index
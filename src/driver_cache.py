@@ -0,0 +1,108 @@
+import os, sys, json, shutil, threading, logging
+
+from config import config
+
+# Where the resolved driver gets remembered, and where the drivers get downloaded to
+CACHE_PATH = os.path.join(config.appdata, 'chromedriver.json')
+DRIVER_DIR = os.path.join(config.appdata, 'chromedriver')
+
+lock = threading.Lock()
+driver_path = None
+
+def chrome_binary():
+    """
+    Finds Chrome's executable, returning None if it can't be found
+    """
+
+    if sys.platform == 'win32':
+        candidates = [
+            os.path.join(os.getenv(var) or '', 'Google', 'Chrome', 'Application', 'chrome.exe')
+            for var in ['PROGRAMFILES', 'PROGRAMFILES(X86)', 'LOCALAPPDATA']
+        ]
+    elif sys.platform == 'darwin':
+        candidates = ['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome']
+    else:
+        candidates = [shutil.which(name) for name in ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser']]
+
+    for candidate in candidates:
+        if candidate and os.path.isfile(candidate):
+            return os.path.realpath(candidate)
+
+    return None
+
+def chrome_fingerprint():
+    """
+    Gets something that changes whenever Chrome gets updated, without having to run it
+    """
+
+    binary = chrome_binary()
+    if binary == None:
+        return None
+
+    stat = os.stat(binary)
+    return [binary, stat.st_size, int(stat.st_mtime)]
+
+def load_cache():
+    try:
+        with open(CACHE_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache):
+    try:
+        with open(CACHE_PATH, 'w') as f:
+            json.dump(cache, f, indent=4)
+    except OSError as e:
+        logging.warning(f'Unable to save the chromedriver cache: {e}')
+
+def use_driver(path):
+    # Make sure that selenium can find the driver too
+    dir = os.path.dirname(path)
+    if dir not in os.environ.get('PATH', '').split(os.pathsep):
+        os.environ['PATH'] = dir + os.pathsep + os.environ.get('PATH', '')
+
+def install_chromedriver():
+    """
+    Gets the path of a chromedriver that matches the installed version of Chrome. The driver is only
+    looked up (and downloaded if needed) when Chrome has changed since last time, as that means asking
+    Chrome for it's version and going out to the network.
+    """
+
+    global driver_path
+
+    with lock:
+        if driver_path != None:
+            return driver_path
+
+        cache = load_cache()
+        fingerprint = chrome_fingerprint()
+
+        # Reuse the last driver if Chrome hasn't changed since
+        if fingerprint != None and cache.get('fingerprint') == fingerprint and os.path.isfile(cache.get('driver', '')):
+            logging.info(f'Using cached chromedriver for Chrome {cache.get("chrome_version")}')
+            driver_path = cache['driver']
+            use_driver(driver_path)
+            return driver_path
+
+        import chromedriver_autoinstaller
+
+        # Without a fingerprint, fall back to checking Chrome's version, which is still cheaper than resolving the driver
+        version = chromedriver_autoinstaller.get_chrome_version()
+        if fingerprint == None and version != None and cache.get('chrome_version') == version and os.path.isfile(cache.get('driver', '')):
+            logging.info(f'Using cached chromedriver for Chrome {version}')
+            driver_path = cache['driver']
+            use_driver(driver_path)
+            return driver_path
+
+        logging.info(f'Installing chromedriver for Chrome {version}')
+        os.makedirs(DRIVER_DIR, exist_ok=True)
+
+        path = chromedriver_autoinstaller.install(path=DRIVER_DIR)
+        if not path:
+            raise Exception(f'Unable to install chromedriver for Chrome {version}')
+
+        save_cache({'fingerprint': fingerprint, 'chrome_version': version, 'driver': path})
+
+        driver_path = path
+        return driver_path
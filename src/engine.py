@@ -0,0 +1,761 @@
+from config import config
+from db import DB, Product
+from connection import connections
+from ratelimit import HostRateLimiter
+from browser_pool import BrowserPool
+from page_parser import parse_page1, parse_page2
+from recorder import RecordingBackend, ReplayBackend
+from readiness import Readiness
+from scheduler import Scheduler
+from planner import plan_crawls
+from seen_index import seen_indexes
+from driver_cache import install_chromedriver
+from supervisor import BrowserSupervisor
+from metrics import Metrics, QueryStats
+from profiler import CycleProfiler
+from retention import Retention, ProductArchive
+
+import os, logging, time, re, html, subprocess, urllib.parse, threading, queue
+
+# Matches the URLs of the 'cl-search-result' layout
+LAYOUT2_RE = re.compile(r'^.+#search=\d+~.+~\d+~\d+$')
+
+# Size the seen product index before any databases get opened
+seen_indexes.memory_mb = config.seen_index_mb
+seen_indexes.bloom_min = config.seen_index_bloom_min
+
+class Backend:
+    """
+    Interface for the different ways of fetching Craigslist result pages
+    """
+
+    # Name of the backend, used when logging
+    name = ''
+
+    # Relative cost of fetching a page, used to pick the cheapest backend that works for a query
+    cost = 0
+
+    # Whether the backend is able to page through the 'cl-search-result' layout, which needs JavaScript
+    can_page2 = False
+
+    # The currently loaded page
+    url = None
+    source = ''
+
+    def get(self, url):
+        """
+        Loads a webpage
+        """
+
+        self.url = url
+        self.source = ''
+
+    @property
+    def current_url(self):
+        return self.url
+
+    @property
+    def page_source(self):
+        return self.source
+
+    def can_parse(self):
+        """
+        Checks if the search results of the currently loaded page can be parsed from it's source
+        """
+
+        return False
+
+    def next_page1(self):
+        """
+        Moves onto the next page of results using the 'result-row' layout, returning False if there are no more
+        """
+
+        return False
+
+    def next_page2(self):
+        """
+        Moves onto the next page of results using the 'cl-search-result' layout, returning False if there are no more.
+        Only used with backends that set can_page2.
+        """
+
+        return False
+
+    def is_alive(self):
+        """
+        Checks if the backend is still usable
+        """
+
+        return True
+
+    def close(self):
+        pass
+
+class SeleniumBackend(Backend):
+    """
+    Fetches pages with a headless instance of Chrome, which is able to handle pages rendered with JavaScript
+    """
+
+    name = 'selenium'
+    cost = 10
+    can_page2 = True
+
+    def __init__(self, readiness):
+        self.readiness = readiness
+
+        # Selenium takes a while to import, so only load it once a browser is actually needed
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service as ChromeService
+
+        driver = install_chromedriver()
+        logging.info('Starting webdriver')
+
+        # Setup the browser to run headless
+        options = webdriver.ChromeOptions()
+        options.add_argument('--headless')
+        
+        # Disable loading images, as we don't need them. (It'll make things go a lot quicker)
+        options.add_experimental_option('prefs', {'profile.default_content_setting_values.images': 2})
+        options.add_experimental_option('excludeSwitches', ['enable-logging'])
+
+        # Don't pop up a console window for the driver on Windows
+        service = ChromeService(driver)
+        service.creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+
+        # Start the headless version of chrome
+        self.driver = webdriver.Chrome(service=service, chrome_options=options)
+        self.driver.maximize_window()
+        self.driver.delete_all_cookies()
+
+        # The driver's process, which all of the browser's processes run under, and how many pages have been loaded
+        self.pid = service.process.pid
+        self.pages = 0
+
+    def get(self, url):
+        self.pages += 1
+        self.driver.get(url)
+        self.readiness.wait_loaded(self.driver)
+
+    @property
+    def current_url(self):
+        return self.driver.current_url
+
+    @property
+    def page_source(self):
+        return self.driver.page_source
+
+    def can_parse(self):
+        # The browser renders everything, so it can handle any of the layouts
+        return True
+
+    def next_page1(self):
+        # Check if there's a link to the next page
+        try:
+            next_link = self.driver.find_element('xpath', '//a[@class="button next"]')
+            href = next_link.get_attribute('href')
+            more_pages = len(href) != 0
+                
+            # Load the new page
+            if more_pages:
+                self.get(href)
+            
+        except:
+            more_pages = False
+
+        return more_pages
+
+    def next_page2(self):
+        # Locate the next page button
+        next_page = self.driver.find_element('xpath', '//button[contains(@class, "cl-next-page")]')
+
+        # Check if the button is disabled, i.e. no more pages
+        disabled = 'bd-disabled' in next_page.get_attribute('class').split()
+        if disabled:
+            return False
+
+        # If not, then click the button to move onto the next page, and wait for it to show up
+        old_url = self.driver.current_url
+        old_fingerprint = self.readiness.fingerprint(self.driver)
+        self.pages += 1
+        next_page.click()
+        self.readiness.wait_page_turn(self.driver, old_url, old_fingerprint)
+        return True
+
+    def is_alive(self):
+        # Make sure that both the driver and the browser still respond
+        try:
+            return self.driver.execute_script('return 1;') == 1
+        except Exception:
+            return False
+
+    def close(self):
+        logging.info('Cleaning up Chromedriver')
+
+        try:
+            self.driver.quit()
+        except Exception as e:
+            # Chrome is probably already dead, so make sure that the driver at least doesn't stick around
+            logging.error(f'Failed to quit Chromedriver, killing it: {e}')
+            self.driver.service.process.kill()
+
+class HttpBackend(Backend):
+    """
+    Fetches pages with plain HTTP requests over pooled keep-alive connections. This is a lot
+    cheaper than running a browser, but only works with the layouts that are rendered server-side.
+    """
+
+    name = 'http'
+    cost = 1
+
+    # Matches the tag of the link to the next page, and the link itself
+    next_link_re = re.compile(r'<a\b[^>]*\bclass="button next"[^>]*>')
+    href_re = re.compile(r'\bhref="([^"]*)"')
+
+    def __init__(self, timeout=30):
+        import urllib3
+
+        self.pool = urllib3.PoolManager(
+            maxsize=4,
+            timeout=urllib3.Timeout(total=timeout),
+            retries=urllib3.Retry(total=3, redirect=5, backoff_factor=0.5),
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0 Safari/537.36'}
+        )
+
+    def get(self, url):
+        response = self.pool.request('GET', url)
+
+        if response.status >= 400:
+            raise Exception(f'Got HTTP status {response.status} for {url}')
+
+        # Keep track of where we ended up after any redirects
+        self.url = urllib.parse.urljoin(url, response.geturl() or url)
+        self.source = response.data.decode('utf-8', errors='replace')
+
+    def can_parse(self):
+        # Only the 'result-row' layout has the results in the page's source
+        return 'id="search-results"' in self.source and 'result-row' in self.source
+
+    def next_page1(self):
+        # Check if there's a link to the next page
+        tag = HttpBackend.next_link_re.search(self.source)
+        if tag == None:
+            return False
+
+        href = HttpBackend.href_re.search(tag.group(0))
+        if href == None or len(href.group(1)) == 0:
+            return False
+
+        # Load the new page. (The link is taken straight from the HTML, so any entities like &amp; need decoding)
+        self.get(urllib.parse.urljoin(self.url, html.unescape(href.group(1))))
+        return True
+
+    def close(self):
+        self.pool.clear()
+
+def is_layout2(url):
+    """
+    Checks if a URL belongs to a page with the 'cl-search-result' layout, which keeps it's state in the URL's hash
+    """
+
+    return LAYOUT2_RE.search(url or '') != None
+
+# All the available backends, from cheapest to most expensive
+backends = sorted([HttpBackend, SeleniumBackend], key=lambda backend: backend.cost)
+
+class Fetcher:
+    """
+    Set of backend instances that is used by a single crawler thread at a time
+    """
+
+    def __init__(self, browsers):
+        self.browsers = browsers
+        self.backends = {}
+
+    def get_backend(self, backend_type):
+        """
+        Grabs the instance of a backend, starting it up if needed
+        """
+
+        if backend_type.name not in self.backends:
+            # Browsers are expensive to start, so they come from the shared pool
+            if backend_type == SeleniumBackend:
+                self.backends[backend_type.name] = self.browsers.checkout()
+            else:
+                self.backends[backend_type.name] = backend_type()
+
+        return self.backends[backend_type.name]
+
+    def release(self):
+        """
+        Returns the browser session that was checked out, if any, back to the pool
+        """
+
+        session = self.backends.pop(SeleniumBackend.name, None)
+        if session != None:
+            self.browsers.checkin(session)
+
+    def close(self):
+        self.release()
+
+        for backend in self.backends.values():
+            backend.close()
+
+        self.backends = {}
+
+class Engine:
+    """
+    Craigslist web-scraper and updater, which crawls the due queries on a pool of crawler threads.
+    Doesn't depend on Qt, so that it can be driven by the GUI or run headless.
+    """
+
+    def __init__(self, recorder=None, archive=None, interrupted=None):
+        # Checked every so often to find out if the update should stop early
+        self.stop_event = threading.Event()
+        self.interrupted = interrupted or self.stop_event.is_set
+
+        # Records every page that gets visited, or replays the pages of an archive instead of going out to the network
+        self.recorder = recorder
+        self.archive = archive
+
+        # Idle fetchers for the crawler threads, and which backend was picked for each query URL
+        self.fetchers = []
+        self.fetchers_lock = threading.Lock()
+        self.query_backends = {}
+
+        # Warm browser sessions shared by all the crawler threads, which get recycled once they grow too big
+        self.readiness = Readiness(config.page_timeout)
+        self.supervisor = BrowserSupervisor(config.browser_max_mb, config.browser_max_pages, os.path.join(config.appdata, 'browsers'))
+        self.browsers = BrowserPool(config.browser_pool_size, lambda: SeleniumBackend(self.readiness), supervisor=self.supervisor, interrupted=self.interrupted)
+
+        self.limiter = None
+
+        # Decides when each query gets updated, and which queries are due for this run (all of them if None)
+        self.scheduler = Scheduler(config.update_secs, config.schedule_min_secs, config.schedule_max_secs, config.fetch_budget)
+        self.due = None
+
+        self.results_lock = threading.Lock()
+        self.total_products = {}
+        self.status = 'ok'
+        self.query_statuses = {}
+
+        # Keeps track of where the time of each update goes, except when replaying
+        if archive == None:
+            self.metrics = Metrics(os.path.join(config.appdata, 'metrics.json'), config.metrics_history)
+
+            if config.metrics_port:
+                self.metrics.serve(config.metrics_port)
+        else:
+            self.metrics = Metrics()
+
+        self.cycle = None
+
+        # Gets rid of the products that haven't been seen for a while, a few batches every cycle
+        archive = ProductArchive(os.path.join(config.appdata, 'archive')) if config.retention_archive else None
+        self.retention = Retention(config.retention_days, config.retention_batch_size, config.retention_max_batches, archive)
+
+        # Profiles the next few cycles when asked to
+        self.profiler = CycleProfiler(os.path.join(config.appdata, 'profiles'))
+        self.profiling = False
+
+    def request_stop(self):
+        self.stop_event.set()
+
+    def close(self):
+        # Clean up
+        for fetcher in self.fetchers:
+            fetcher.close()
+
+        self.fetchers = []
+        self.browsers.close()
+        self.metrics.stop()
+
+    def checkout_fetcher(self):
+        """
+        Grabs an idle fetcher, or creates a new one if there are none
+        """
+
+        with self.fetchers_lock:
+            if self.fetchers:
+                return self.fetchers.pop()
+
+        return Fetcher(self.browsers)
+
+    def checkin_fetcher(self, fetcher):
+        """
+        Returns a fetcher so that it can be reused by the next crawler thread
+        """
+
+        with self.fetchers_lock:
+            self.fetchers.append(fetcher)
+
+    def load(self, fetcher, query_url, stats):
+        """
+        Loads the first page of a query with the cheapest backend that is able to parse it,
+        trying the one that worked last time first
+        """
+
+        # When replaying, all the pages come from the archive
+        if self.archive != None:
+            backend = ReplayBackend(self.archive)
+
+            with stats.timing('fetch'):
+                backend.get(query_url)
+
+            stats.pages += 1
+            return backend
+
+        order = sorted(backends, key=lambda backend: backend.name != self.query_backends.get(query_url))
+        errors = []
+
+        for backend_type in order:
+            try:
+                # Starting up a backend (or waiting for a browser from the pool) counts as waiting
+                with stats.timing('wait'):
+                    backend = fetcher.get_backend(backend_type)
+
+                if self.recorder != None:
+                    backend = RecordingBackend(backend, self.recorder)
+
+                self.throttle(query_url, stats)
+
+                with stats.timing('fetch'):
+                    backend.get(query_url)
+
+                stats.pages += 1
+
+                # Pages with the 'cl-search-result' layout can only be paged through by some of the backends
+                parsable = backend.can_parse() and (backend.can_page2 or not is_layout2(backend.current_url))
+            except Exception as e:
+                # Craigslist often turns away clients that aren't browsers, so fall through to the next backend
+                if self.interrupted():
+                    raise
+
+                logging.warning(f'The {backend_type.name} backend failed to load {query_url}: {e}')
+                errors.append(f'{backend_type.name}: {e}')
+                continue
+
+            if parsable:
+                if self.query_backends.get(query_url) != backend.name:
+                    logging.info(f'Using the {backend.name} backend for {query_url}')
+
+                # Remember what worked, so that the next cycles start with it
+                self.query_backends[query_url] = backend.name
+                return backend
+
+            errors.append(f'{backend_type.name}: unable to parse the page')
+
+        raise Exception(f'None of the backends were able to parse {query_url} ({"; ".join(errors)})')
+
+    def throttle(self, url, stats):
+        """
+        Waits until we are allowed to make another request to the host of a URL
+        """
+
+        # There's no need to hold back when replaying
+        if self.archive == None:
+            with stats.timing('wait'):
+                self.limiter.acquire(url, self.interrupted)
+
+    def search_page1(self, backend, query_url, db, stats):
+        """
+        Helper function to search the current page for new products, update the 
+        database, and return a list of all the products on the page and of the newly found ones.
+        """
+
+        logging.info(f'Searching {backend.current_url} using method 1')
+
+        # Parse the search results out of the webpage
+        with stats.timing('parse'):
+            products = [Product(id, name, url, query_url) for id, name, url in parse_page1(backend.page_source)]
+
+        return products, self.store_products(products, db, stats)
+
+    def search_page2(self, backend, query_url, db, stats):
+        """
+        Helper function to search the current page for new products, update the 
+        database, and return a list of all the products on the page and of the newly found ones.
+        """
+
+        logging.info(f'Searching {backend.current_url} using method 2')
+
+        # Parse the search results out of the webpage
+        with stats.timing('parse'):
+            products = [Product(id, name, url, query_url) for id, name, url in parse_page2(backend.page_source)]
+
+        return products, self.store_products(products, db, stats)
+
+    def store_products(self, products, db, stats):
+        """
+        Adds or updates a page worth of products in the database, returning the ones that are new
+        """
+
+        with stats.timing('db'):
+            new_ids = db.upsert_products(products)
+
+        new_products = []
+
+        for product in products:
+            # Only report each new product once, even if it shows up multiple times on a page
+            if product.id in new_ids:
+                new_ids.discard(product.id)
+                new_products.append(product)
+
+        return new_products
+
+    def crawl_url(self, query_url):
+        """
+        Gets the URL that is actually crawled for a query, which lists the newest products first when crawling incrementally
+        """
+
+        if not config.incremental:
+            return query_url
+
+        return query_url + '&sort=date'
+
+    def update_products(self, query_url, db, fetcher, stats):
+        """
+        Goes to the query-url, iterates through all the pages, and finds and returns
+        a list of all new products while updating the database.
+        """
+
+        # Every once in a while crawl all the pages, so that the older products still get marked as seen. When that
+        # last happened is kept in the database, so that it carries over between runs (e.g. of the daemon with --once)
+        full_crawl = not config.incremental or time.time() - db.get_full_crawl(query_url) >= config.full_crawl_secs
+        
+        # Load the webpage
+        backend = self.load(fetcher, self.crawl_url(query_url), stats)
+
+        # List of new products that we have found
+        new_products = []
+
+        # Number of pages that we've gone through, and of products in a row that we already knew about
+        pages = 0
+        known_run = 0
+
+        # Loop until we've reached all the pages
+        more_pages = True
+        while more_pages:
+            # Make sure that an interruption is not requested
+            if self.interrupted():
+                return new_products
+        
+            # Check if what type of URL we have, so we know what method to search the pages with
+            layout2 = backend.can_page2 and is_layout2(backend.current_url)
+
+            if layout2:
+                products, page_new_products = self.search_page2(backend, query_url, db, stats)
+            else:
+                products, page_new_products = self.search_page1(backend, query_url, db, stats)
+
+            new_products.extend(page_new_products)
+            pages += 1
+
+            stats.rows += len(products)
+            stats.new_rows += len(page_new_products)
+
+            new_ids = {product.id for product in page_new_products}
+            for product in products:
+                known_run = 0 if product.id in new_ids else known_run + 1
+
+            # As the newest products come first, we can stop once we reach the ones we already know about
+            if not full_crawl and len(products) != 0:
+                if config.incremental_stop_rows > 0:
+                    caught_up = known_run >= config.incremental_stop_rows
+                else:
+                    caught_up = len(page_new_products) == 0
+
+                if caught_up:
+                    break
+
+            self.throttle(backend.current_url, stats)
+
+            with stats.timing('fetch'):
+                more_pages = backend.next_page2() if layout2 else backend.next_page1()
+
+            if more_pages:
+                stats.pages += 1
+
+        if full_crawl:
+            db.set_full_crawl(query_url, time.time())
+
+        logging.info(f'Went through {pages} pages of {query_url}{" (full crawl)" if full_crawl else ""}')
+        return new_products
+        
+    def run(self):
+        try:
+            self.update_queries()
+        finally:
+            # Updates usually happen on a new thread, so don't leave it's database connection hanging around
+            connections.close()
+
+    def email_products(self, db):
+        """
+        Grabs the new products of the last update that should be emailed, keyed by the name of their query
+        """
+
+        email_products = {}
+
+        for id, products in self.total_products.items():
+            if len(products) == 0:
+                continue
+
+            query = db.get_query(id)
+            if query != None and query.email:
+                email_products[query.name()] = products
+
+        return email_products
+
+    def update_queries(self):
+        """
+        Updates the products of all the queries in the database
+        """
+
+        self.total_products = {}
+        self.query_statuses = {}
+        self.status = 'ok'
+        self.readiness.reset()
+        self.cycle = self.metrics.start_cycle(config.update_secs)
+        self.profiling = self.profiler.cycles_left > 0 and self.profiler.start_cycle()
+
+        # Whatever happens, the cycle has to be finished off, or the profiler would be left running
+        try:
+            self.update_cycle()
+        except Exception:
+            self.status = 'bad'
+            raise
+        finally:
+            self.end_cycle()
+
+    def update_cycle(self):
+        """
+        Crawls the queries that are due, on a pool of crawler threads
+        """
+
+        try:
+            # Free up space in the database by deleting any of the products we haven't seen in a long time
+            db = DB(config.db_path)
+            self.retention.run(db)
+        
+            # Grab the queries
+            queries = db.get_queries()
+        except Exception as e:
+            logging.exception(f'Failed to setup the database: {e}')
+            self.status = 'bad'
+            return
+
+        # Only update the queries that are due, crawling each distinct result set once
+        plan = plan_crawls(queries, self.due)
+        queries = [query for job in plan for query in job.queries]
+
+        jobs = queue.Queue()
+        for job in plan:
+            jobs.put(job)
+
+        # Clean up after any earlier runs that crashed before they could shut their browsers down
+        if self.archive == None:
+            self.supervisor.reap()
+
+        # Start warming up the browsers in the background if any of the queries might need one
+        if self.archive == None and any(self.query_backends.get(self.crawl_url(job.url)) != HttpBackend.name for job in plan):
+            self.browsers.warm()
+
+        # Limit how often we hit each Craigslist area, across all of the crawler threads
+        self.limiter = HostRateLimiter(config.host_rate, config.host_burst)
+
+        if self.recorder != None:
+            self.recorder.start_cycle(queries)
+
+        # Crawl several of the queries at once
+        workers = []
+
+        try:
+            for i in range(min(max(config.max_workers, 1), jobs.qsize())):
+                worker = threading.Thread(target=self.crawl, args=(jobs,), name=f'Crawler-{i}')
+                worker.start()
+                workers.append(worker)
+        finally:
+            # Let any crawlers that did start finish, even if the others couldn't be started
+            for worker in workers:
+                worker.join()
+
+            if self.recorder != None:
+                self.recorder.end_cycle()
+
+        # Log how long we've been waiting on pages, to help with tuning
+        if self.readiness.waits:
+            logging.info(f'Page waits: {self.readiness.summary()}')
+
+        if self.supervisor.recycles or self.supervisor.reaped:
+            logging.info(f'Browser sessions: {self.supervisor.summary()}')
+
+    def end_cycle(self):
+        try:
+            self.metrics.end_cycle(self.cycle, self.status)
+        finally:
+            if self.profiling:
+                self.profiling = False
+                self.profiler.end_cycle()
+
+    def crawl(self, jobs):
+        """
+        Crawler thread, which keeps updating queries until there are none left
+        """
+
+        db = DB(config.db_path)
+        fetcher = self.checkout_fetcher()
+
+        try:
+            while not self.interrupted():
+                try:
+                    job = jobs.get_nowait()
+                except queue.Empty:
+                    break
+
+                if self.profiling:
+                    with self.profiler.job([query.id for query in job.queries]):
+                        self.update_job(job, db, fetcher)
+                else:
+                    self.update_job(job, db, fetcher)
+
+        finally:
+            self.checkin_fetcher(fetcher)
+            connections.close()
+
+    def update_job(self, job, db, fetcher):
+        """
+        Crawls the result set of a job, fans the products out to all of it's queries, and records how it went
+        """
+
+        stats = QueryStats(job.url, [query.name() for query in job.queries])
+        start = time.perf_counter()
+
+        try:
+            products = self.update_products(job.url, db, fetcher, stats)
+
+            with self.results_lock:
+                for query in job.queries:
+                    if products != None:
+                        self.total_products[query.id] = products
+
+                    self.query_statuses[query.url()] = 'ok'
+
+            for query in job.queries:
+                self.scheduler.record(query.id, len(products), True)
+        except Exception as e:
+            logging.exception(f'Failed to update {job.url}. Reason: {e}')
+            stats.failures += 1
+
+            with self.results_lock:
+                for query in job.queries:
+                    self.query_statuses[query.url()] = 'bad'
+
+                self.status = 'bad'
+
+            for query in job.queries:
+                self.scheduler.record(query.id, 0, False)
+
+        finally:
+            # Give the browser back between queries, so that it gets health-checked
+            fetcher.release()
+
+            stats.duration = time.perf_counter() - start
+            self.cycle.add(stats)
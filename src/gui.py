@@ -1,14 +1,17 @@
-import os, sys, logging
+import os, sys, logging, time, math
 
 from PyQt5.QtCore import *
 from PyQt5.QtWidgets import *
 from PyQt5.QtGui import * 
-from PyQt5.QtMultimedia import*
 
 from updater import Updater
+from recorder import Recorder
 from config import config
 from db import DB, Query
-from send_email import send_email
+from notifier import Notifier
+from query_table import QueryTableModel, AreaDelegate, SectionDelegate
+from product_browser import ProductBrowser, SearchDialog
+from startup import startup
 
 class PrefDialog(QDialog):
     def __init__(self, parent=None):
@@ -139,147 +142,35 @@ class PrefDialog(QDialog):
 
         self.close()
 
-class TableRow():
-    def __init__(self, table, index, query, items_found, failed, enabled):
-        # Setup the area validtor
-        re = QRegularExpression('[a-z]*')
-        re.setPatternOptions(QRegularExpression.CaseInsensitiveOption);
-        area_validator = QRegularExpressionValidator(re)
-
-        area = QLineEdit()
-        area.setValidator(area_validator)
-        area.setToolTip('Craigslist search area')
-        area.setText(query.area)
-        area.textChanged.connect(self.area_changed)
-        area.setEnabled(enabled)
-
-        section = QComboBox()
-        section.setToolTip('Craigslist section')
-        section.addItems(Query.sections.keys())
-        section.setCurrentText(query.section)
-        section.currentTextChanged.connect(self.section_changed)
-        section.setEnabled(enabled)
-
-        search = QLineEdit()
-        search.setToolTip('Search query for Craigslist')
-        search.setText(query.query)
-        search.textChanged.connect(self.query_changed)
-        search.setEnabled(enabled)
-            
-        email = QCheckBox()
-        email.setToolTip('Enable/Disable sending email alerts')
-        email.setChecked(query.email)
-        email.stateChanged.connect(self.email_changed)
-        email.setEnabled(enabled)
-
-        alarm = QCheckBox()
-        alarm.setToolTip('Enable/Disable sounding an alarm')
-        alarm.setChecked(query.alarm)
-        alarm.stateChanged.connect(self.alarm_changed)
-        alarm.setEnabled(enabled)
-
-        # Update the color of both checkboxs to make them more visible
-        checkbox_palette = email.palette()
-        checkbox_palette.setColor(QPalette.Active, QPalette.Background, QColor(102, 102, 102))
-        checkbox_palette.setColor(QPalette.Disabled, QPalette.Background, QColor(102, 102, 102))
-        email.setPalette(checkbox_palette)
-        alarm.setPalette(checkbox_palette)
-
-        # Check if the query had previous failed, and if so highlight everything red
-        if failed:
-            area.setStyleSheet('QLineEdit { color: red;}');
-            section.setStyleSheet('QComboBox { color: red;}');
-            search.setStyleSheet('QLineEdit { color: red;}');
-
-        db = DB(config.db_path)
-        total_items_found = db.get_num_products(query.url())
-
-        found = QPushButton(str(total_items_found))
-        found.setToolTip('Number of items found in the last update')
-        found.clicked.connect(self.list_products)
-        found.setEnabled(True)
-        
-        if items_found > 0:
-            found.setStyleSheet('QPushButton { color: green; }');
-
-        table.setCellWidget(index, 0, area)
-        table.setCellWidget(index, 1, section)
-        table.setCellWidget(index, 2, search)
-        table.setCellWidget(index, 3, email)
-        table.setCellWidget(index, 4, alarm)
-        table.setCellWidget(index, 5, found)
-
-        self.id = query.id
-
-    def area_changed(self, text):
-        # Update the query's area in the database
-        db = DB(config.db_path)
-        query = db.get_query(self.id)
-        query.area = text
-        
-        db.update_query(query)
-
-    def section_changed(self, text):
-        # Update the query's section in the database
-        db = DB(config.db_path)
-        query = db.get_query(self.id)
-        query.section = text
-        
-        db.update_query(query)
-
-    def query_changed(self, text):
-        # Update the query's query search in the database
-        db = DB(config.db_path)
-        query = db.get_query(self.id)
-        query.query = text
-        
-        db.update_query(query)
-     
-    def email_changed(self, state):
-        # Update the query's email flag in the database
-        db = DB(config.db_path)
-        query = db.get_query(self.id)
-        query.email = state != 0
-        
-        db.update_query(query)
-        
-    def alarm_changed(self, state):
-        # Update the query's alarm flag in the database
-        db = DB(config.db_path)
-        query = db.get_query(self.id)
-        query.alarm = state != 0
-
-        db.update_query(query)
-
-    def list_products(self):
-        db = DB(config.db_path)
-        query = db.get_query(self.id)
-        products = db.get_products(query.url())     
-
-        dlg = QDialog()
-        dlg.setWindowTitle(f'Products found by {query.name()}')
-        
-        layout = QVBoxLayout()
-        browser = QTextBrowser(minimumWidth=450, minimumHeight=600)
-        browser.setOpenExternalLinks(True)
-        
-        for product in products:
-            browser.append(f'<a href="{product.url}">{product.name}</a>')
-        
-        button_box = QDialogButtonBox(QDialogButtonBox.Ok)
-        button_box.accepted.connect(dlg.accept)
-        
-        layout.addWidget(browser)
-        layout.addWidget(button_box)
-        dlg.setLayout(layout)
-        dlg.exec()
+class NotifierSignals(QObject):
+    """
+    Carries the results of the notifier over to the GUI thread
+    """
+
+    finished = pyqtSignal(bool, str)
 
 class Main(QMainWindow):
-    def __init__(self, app, hide_window):
+    def __init__(self, app, hide_window, record_path=None, profile_cycles=0):
         super(QMainWindow, self).__init__()
         
-        self.found = {}
-        self.failed_queries = set()
+        # Shared database for the GUI thread
+        self.db = DB(config.db_path)
+        startup.mark('database')
+
+        # Setup the updater, and the scheduler that decides when each query gets updated
+        self.updater = Updater(Recorder(record_path) if record_path else None)
+        self.engine = self.updater.engine
+        self.scheduler = self.engine.scheduler
+        self.scheduler.sync(self.db.get_queries())
+
+        if profile_cycles > 0:
+            self.engine.profiler.arm(profile_cycles)
+
+        # Send the emails in the background, so that a slow or failing server doesn't hold up the GUI
+        self.notifier_signals = NotifierSignals()
+        self.notifier_signals.finished.connect(self.email_finished)
+        self.notifier = Notifier(self.notifier_signals.finished.emit)
+        self.notifier.start()
 
         # Setup the UI
         self.make_ui(app)
@@ -289,8 +180,10 @@ class Main(QMainWindow):
             self.hide()
         
         # Start the update schedule
-        self.counter = config.update_secs
-        self.updater = Updater()
+        self.update_timer = QTimer()
+        self.update_timer.timeout.connect(self.start_update)
+        self.update_timer.setSingleShot(False)
+
         self.updater.finished.connect(self.finish_update)
         self.start_update()
         
@@ -324,6 +217,12 @@ class Main(QMainWindow):
         pref_action.setToolTip('Shows a preferences dialog')
         pref_action.triggered.connect(self.pref_dialog)
         settings_menu.addAction(pref_action)
+
+        # Add the profiling option
+        profile_action = QAction('P&rofile Updates...', self)
+        profile_action.setToolTip('Profiles the next update cycles, to find out where the time goes')
+        profile_action.triggered.connect(self.profile_dialog)
+        settings_menu.addAction(profile_action)
         
         # Create the help menu
         help_menu = bar.addMenu('&Help')
@@ -374,15 +273,27 @@ class Main(QMainWindow):
         self.stop_button.clicked.connect(self.stop_updater)
         updater_buttons_layout.addWidget(self.stop_button)
         
+        # Setup the search box, which searches through all the stored products
+        self.search = QLineEdit()
+        self.search.setPlaceholderText('Search all products...')
+        self.search.setToolTip('Searches the names of all the products that have been found')
+        self.search.setClearButtonEnabled(True)
+        self.search.returnPressed.connect(self.search_products)
+
         # Setup the table
         table_layout = QHBoxLayout()
         
-        self.table = QTableWidget()
+        self.model = QueryTableModel(self.db, self.scheduler)
+
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.table.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff);
         self.table.setSizeAdjustPolicy(QAbstractScrollArea.AdjustToContents)
-        self.table.setColumnCount(6)
-        self.table.setRowCount(10)
-        self.table.setHorizontalHeaderLabels(['Area', 'Section', 'URL', 'Email', 'Alarm', 'Found'])
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setItemDelegateForColumn(QueryTableModel.AREA, AreaDelegate(self.table))
+        self.table.setItemDelegateForColumn(QueryTableModel.SECTION, SectionDelegate(self.table))
+        self.table.clicked.connect(self.table_clicked)
         
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
@@ -405,6 +316,7 @@ class Main(QMainWindow):
         # Setup the main layout
         layout = QVBoxLayout()
         layout.addLayout(updater_buttons_layout)
+        layout.addWidget(self.search)
         layout.addLayout(table_layout)
 
         # Set the main layout
@@ -421,31 +333,35 @@ class Main(QMainWindow):
         self.setWindowTitle('CL-Checker')
         self.show()
         self.update_table(False)
+        startup.mark('window')
 
     def close(self, app):
         # Make sure that the thread is stopped
         self.stop_updater()
         self.updater.wait()
         self.updater.quit()
+        self.notifier.stop(timeout=10)
         
         app.quit()
 
     def update_table(self, enabled):
-        db = DB(config.db_path)
-        queries = db.get_queries()
+        self.model.set_editable(enabled)
+        self.model.refresh()
+
+    def table_clicked(self, index):
+        # List the products of a query when it's found count is clicked
+        if index.column() == QueryTableModel.FOUND:
+            self.list_products(self.model.query(index.row()).id)
 
-        self.rows = []
+    def search_products(self):
+        search = SearchDialog(self.db, self.search.text(), self)
+        search.exec()
 
-        self.table.clear()
-        self.table.setColumnCount(6)
-        self.table.setRowCount(len(queries))
-        self.table.setHorizontalHeaderLabels(['Area', 'Section', 'Query', 'Email', 'Alarm', 'Found'])
+    def list_products(self, id):
+        query = self.db.get_query(id)
 
-        # Generate the rows
-        for i, query in enumerate(queries):
-            found = 0 if query.id not in self.found else self.found[query.id]
-            failed = query.url() in self.failed_queries
-            self.rows.append(TableRow(self.table, i, query, found, failed, enabled))
+        browser = ProductBrowser(self.db, query, self)
+        browser.exec()
 
     def about_dialog(self):
         # Setup the about dialog
@@ -464,8 +380,17 @@ class Main(QMainWindow):
         pref = PrefDialog(self)
         pref.exec()
 
+    def profile_dialog(self):
+        cycles, ok = QInputDialog.getInt(self, 'Profile Updates', 'Number of update cycles to profile:', 1, 1, 100)
+        if not ok:
+            return
+
+        self.engine.profiler.arm(cycles)
+        self.statusBar().showMessage(f'Profiling the next {cycles} update cycles into {self.engine.profiler.dir}', 10000)
+
     def start_updater(self):
-        self.counter = config.update_secs - 1
+        # Update everything right away
+        self.scheduler.make_all_due()
         self.start_update()
     
         self.start_button.setEnabled(False)
@@ -488,10 +413,7 @@ class Main(QMainWindow):
         self.progress_bar.setFormat('Stopping...')
 
         # Stop the timer if it's already running
-        try:
-            self.update_timer.stop()
-        except:
-            pass
+        self.update_timer.stop()
     
         # Stop the thread
         if self.updater.isRunning():
@@ -516,7 +438,7 @@ class Main(QMainWindow):
         self.start_button.setStyleSheet('QPushButton { background-color: green; }');
 
         # Make sure that we finish the update if there was any products found
-        if self.updater.total_products != {}:
+        if self.engine.total_products != {}:
             self.finish_update(restart_timer=False)
 
         self.update_table(True)
@@ -535,7 +457,7 @@ class Main(QMainWindow):
             return
     
         # Add a new query to the database
-        db = DB(config.db_path)
+        db = self.db
         db.add_query(Query('', 'all', '', 0, 0))
         self.update_table(True)
     
@@ -550,7 +472,7 @@ class Main(QMainWindow):
             
             return
 
-        row = self.table.currentRow()
+        row = self.table.currentIndex().row()
         if row < 0:
             QMessageBox.warning(
                 self, 
@@ -561,10 +483,10 @@ class Main(QMainWindow):
             return 
 
         # Get the ID of the query to delete
-        id = self.rows[row].id
+        id = self.model.query(row).id
         
         # Grab the query
-        db = DB(config.db_path)
+        db = self.db
         query = db.get_query(id)   
         
         # Only confirm the choice if the query string is not empty
@@ -585,28 +507,48 @@ class Main(QMainWindow):
 
     def start_update(self):
         """
-        Starts the updater thread
+        Starts the updater thread if any of the queries are due
         """
-    
-        self.counter += 1
+
+        # Wait for the last update to completely finish
+        if self.updater.isRunning():
+            self.update_timer.start(1000)
+            return
+
+        # Keep the schedule up to date with any changes to the queries or preferences
+        self.scheduler.base_secs = config.update_secs
+        self.scheduler.sync(self.db.get_queries())
+        wait = self.scheduler.seconds_until_due()
 
         # Update the progress bar status
         self.progress_bar.setRange(0, config.update_secs)
-        self.progress_bar.setValue(self.counter)
 
         # Check if it's time to update or not
-        if self.counter < config.update_secs:
-            self.progress_bar.setFormat(f'Updating in {config.update_secs - self.counter} seconds')
+        if wait == None:
+            self.progress_bar.setValue(0)
+            self.progress_bar.setFormat('No queries to update')
+            self.update_timer.start(1000)
             return
+
+        if wait > 0:
+            self.progress_bar.setValue(max(config.update_secs - int(wait), 0))
+            self.progress_bar.setFormat(f'Updating in {math.ceil(wait)} seconds')
+            self.update_timer.start(1000)
+            return
+
+        # Grab the due queries, as far as the fetch budget allows
+        due = self.scheduler.take_due()
+        if not due:
+            self.progress_bar.setFormat('Fetch budget used up, waiting...')
+            self.update_timer.start(1000)
+            return
+
+        self.update_timer.stop()
     
-        try:
-            self.update_timer.stop()
-        except:
-            pass
-    
-        logging.info('Starting update thread...')
+        logging.info(f'Starting update thread for {len(due)} queries...')
         
         # Start the updater thread
+        self.engine.due = due
         self.updater.start()
         
         # Alert the user that we are updating the update
@@ -618,37 +560,35 @@ class Main(QMainWindow):
         """
     
         # Update the icon
-        if self.updater.status == 'ok':
+        if self.engine.status == 'ok':
             self.tray.setIcon(self.icon)
         else:
             self.tray.setIcon(self.icon_error)
 
         # Check if any of the queries failed, and if so, mark them down
-        for url, status in self.updater.query_statuses.items():
+        for url, status in self.engine.query_statuses.items():
             if status == 'ok':
-                self.failed_queries.discard(url)
+                self.model.failed.discard(url)
             else:
-                self.failed_queries.add(url)
+                self.model.failed.add(url)
 
         # Grab the list of new products
-        total_products = self.updater.total_products
+        total_products = self.engine.total_products
         
         # Find the total number of products found
         total_found = 0
         for id, products in total_products.items():
             total_found += len(products)
-            self.found[id] = len(products)
+            self.model.found[id] = len(products)
         
         # Alert the user with a notification that new products have been found
         if total_found != 0:
             self.tray.showMessage('CL-Checker', f'{total_found} New Products Found!', self.icon, msecs=999999)
     
-        # Open the database
-        db = DB(config.db_path)
+        db = self.db
         play_alarm = False
-        email_products = {}
         
-        # Check if products were found with a query that had the alarm or email enabled
+        # Check if products were found with a query that had the alarm enabled
         for id, products in total_products.items():
             # Check if any products were found
             if len(products) == 0:
@@ -658,13 +598,14 @@ class Main(QMainWindow):
             query = db.get_query(id)
             if query.alarm:
                 play_alarm = True
-   
-            # Check if the query had email enabled, and if so add the products to the list to email
-            if query.email:
-                email_products[query.name()] = products
+
+        # Grab the products of the queries that had email enabled
+        email_products = self.engine.email_products(db)
    
         # Play the alarm if we found any queries that had it enabled
         if play_alarm:
+            # QtMultimedia is slow to load and rarely needed, so only load it once an alarm goes off
+            from PyQt5.QtMultimedia import QSound
             QSound.play(os.path.join(os.path.dirname(__file__), 'assets/alert.wav'))
     
         # Restart the update timer
@@ -673,45 +614,29 @@ class Main(QMainWindow):
 
         # Alert the user that the update has finished
         self.statusBar().showMessage('Finished update')
-        self.updater.total_products = {}
+        self.engine.total_products = {}
         self.update_table(False)
 
-        # Check if we need to send an email
+        # Queue up the email, which gets sent in the background
         if email_products != {}:
             self.statusBar().showMessage('Sending email...')
-            
-            # Attempt to send the email
-            if not send_email(email_products):
-                self.statusBar().showMessage('Failed to send email')
-                
-                # Notify the user that the email failed to send
-                QMessageBox.critical(
-                    self, 
-                    'Error: Email failed to send',
-                    f'Error: Failed to send email to <a href="mailto:{config.to_email}">{config.to_email}</a>', 
-                    QMessageBox.Ok
-                )                
-                
-                return
-            
-            self.statusBar().showMessage('Email sent')
+            self.notifier.submit(email_products)
+
+    def email_finished(self, ok, message):
+        """
+        Shows how sending an email went, without getting in the user's way
+        """
+
+        self.statusBar().showMessage(message)
+
+        if not ok:
+            self.tray.showMessage('CL-Checker', message, QSystemTrayIcon.Critical, msecs=999999)
 
     def start_update_timer(self):
         """
         Starts the timer for the updater
         """
     
-        # Stop the timer if it's already running
-        try:
-            self.update_timer.stop()
-        except:
-            pass
-            
-        # Start the timer
-        self.update_timer = QTimer()
-        self.update_timer.timeout.connect(self.start_update)
-        self.update_timer.setSingleShot(False)
+        # Start the timer, and update the status right away
         self.update_timer.start(1000)
-        self.counter = 0
-
-        self.progress_bar.setFormat(f'Updating in {config.update_secs} seconds')
+        self.start_update()
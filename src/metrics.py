@@ -0,0 +1,225 @@
+import os, json, time, threading, logging, contextlib, collections, http.server
+
+# What the time spent crawling a query is split into
+PHASES = ['fetch', 'wait', 'parse', 'db']
+
+class QueryStats:
+    """
+    What it took to crawl a single result set, which might be shared by several queries
+    """
+
+    def __init__(self, url, names):
+        self.url = url
+        self.names = names
+        self.pages = 0
+        self.rows = 0
+        self.new_rows = 0
+        self.failures = 0
+        self.duration = 0
+        self.times = dict.fromkeys(PHASES, 0.0)
+
+    @contextlib.contextmanager
+    def timing(self, phase):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.times[phase] += time.perf_counter() - start
+
+    def to_dict(self):
+        return {
+            'url': self.url,
+            'names': self.names,
+            'pages': self.pages,
+            'rows': self.rows,
+            'new_rows': self.new_rows,
+            'failures': self.failures,
+            'duration': round(self.duration, 3),
+            'times': {phase: round(secs, 3) for phase, secs in self.times.items()},
+        }
+
+class CycleStats:
+    """
+    Stats of a single update of the due queries
+    """
+
+    def __init__(self, update_secs):
+        self.start = time.time()
+        self.update_secs = update_secs
+        self.duration = 0
+        self.status = 'ok'
+        self.lock = threading.Lock()
+        self.queries = []
+
+    def add(self, stats):
+        with self.lock:
+            self.queries.append(stats)
+
+    def to_dict(self):
+        totals = {key: sum(getattr(stats, key) for stats in self.queries) for key in ['pages', 'rows', 'new_rows', 'failures']}
+
+        return {
+            'start': self.start,
+            'duration': round(self.duration, 3),
+            'update_secs': self.update_secs,
+            'budget_ratio': round(self.duration / self.update_secs, 4) if self.update_secs else None,
+            'status': self.status,
+            **totals,
+            'times': {phase: round(sum(stats.times[phase] for stats in self.queries), 3) for phase in PHASES},
+            'queries': [stats.to_dict() for stats in self.queries],
+        }
+
+class Metrics:
+    """
+    Keeps track of how the update cycles and the queries in them went. The last cycles are kept in a
+    rolling JSON file, and the running totals can be scraped in the Prometheus text format.
+    """
+
+    def __init__(self, json_path=None, history=100):
+        self.json_path = json_path
+        self.lock = threading.Lock()
+        self.server = None
+
+        self.history = collections.deque(maxlen=history)
+        if json_path != None:
+            self.load()
+
+        # Running totals since starting up, keyed by the crawled URL
+        self.cycles = 0
+        self.last_cycle = None
+        self.queries = {}
+
+    def load(self):
+        try:
+            with open(self.json_path, 'r') as f:
+                self.history.extend(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+    def start_cycle(self, update_secs):
+        return CycleStats(update_secs)
+
+    def end_cycle(self, cycle, status):
+        """
+        Finishes off a cycle, adding it to the totals and the history
+        """
+
+        cycle.duration = time.time() - cycle.start
+        cycle.status = status
+        summary = cycle.to_dict()
+
+        with self.lock:
+            self.cycles += 1
+            self.last_cycle = summary
+
+            for stats in cycle.queries:
+                totals = self.queries.setdefault(stats.url, {'pages': 0, 'rows': 0, 'new_rows': 0, 'failures': 0, 'times': dict.fromkeys(PHASES, 0.0)})
+                totals['names'] = stats.names
+                totals['duration'] = stats.duration
+
+                for key in ['pages', 'rows', 'new_rows', 'failures']:
+                    totals[key] += getattr(stats, key)
+
+                for phase in PHASES:
+                    totals['times'][phase] += stats.times[phase]
+
+            self.history.append(summary)
+            history = list(self.history)
+
+        if self.json_path != None:
+            self.save(history)
+
+        logging.info(f'Update took {cycle.duration:.1f}s of {cycle.update_secs}s, going through {summary["pages"]} pages and finding {summary["new_rows"]} new products')
+
+    def save(self, history):
+        # Write to a temporary file first, so that readers never see half of a file
+        temp_path = self.json_path + '.tmp'
+
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(history, f, indent=1)
+
+            os.replace(temp_path, self.json_path)
+        except OSError as e:
+            logging.warning(f'Unable to save the metrics: {e}')
+
+    def prometheus(self):
+        """
+        Renders the running totals in the Prometheus text format
+        """
+
+        lines = []
+
+        def metric(name, type, help, samples):
+            lines.append(f'# HELP cl_checker_{name} {help}')
+            lines.append(f'# TYPE cl_checker_{name} {type}')
+
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+                lines.append(f'cl_checker_{name}{{{label_text}}} {value}' if label_text else f'cl_checker_{name} {value}')
+
+        with self.lock:
+            metric('cycles_total', 'counter', 'Number of update cycles that have finished.', [({}, self.cycles)])
+
+            if self.last_cycle != None:
+                cycle = self.last_cycle
+                metric('cycle_duration_seconds', 'gauge', 'How long the last update cycle took.', [({}, cycle['duration'])])
+                metric('cycle_budget_ratio', 'gauge', 'How long the last update cycle took, relative to update_secs.', [({}, cycle['budget_ratio'] or 0)])
+                metric('cycle_ok', 'gauge', 'Whether all of the queries of the last update cycle succeeded.', [({}, int(cycle['status'] == 'ok'))])
+
+            queries = sorted(self.queries.items())
+            labels = {url: {'url': url, 'queries': ', '.join(totals['names'])} for url, totals in queries}
+
+            metric('query_pages_total', 'counter', 'Pages fetched for a query.', [(labels[url], totals['pages']) for url, totals in queries])
+            metric('query_rows_total', 'counter', 'Rows seen on the pages of a query.', [(labels[url], totals['rows']) for url, totals in queries])
+            metric('query_new_rows_total', 'counter', 'New products found by a query.', [(labels[url], totals['new_rows']) for url, totals in queries])
+            metric('query_failures_total', 'counter', 'Failed crawls of a query.', [(labels[url], totals['failures']) for url, totals in queries])
+            metric('query_seconds_total', 'counter', 'Time spent crawling a query, by phase.', [
+                ({**labels[url], 'phase': phase}, round(totals['times'][phase], 3)) for url, totals in queries for phase in PHASES
+            ])
+            metric('query_duration_seconds', 'gauge', 'How long the last crawl of a query took.', [(labels[url], round(totals['duration'], 3)) for url, totals in queries])
+
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port, host='127.0.0.1'):
+        """
+        Starts serving the metrics at http://host:port/metrics in the background
+        """
+
+        metrics = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+
+                body = metrics.prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            logging.error(f'Unable to serve the metrics on port {port}: {e}')
+            return
+
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name='Metrics', daemon=True).start()
+        logging.info(f'Serving metrics at http://{host}:{port}/metrics')
+
+    def stop(self):
+        if self.server != None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,225 @@
+import smtplib, ssl, threading, queue, time, logging
+
+from config import config
+from send_email import build_messages
+
+class SmtpSession:
+    """
+    SMTP connection that stays logged in between sends, and reconnects whenever it has been dropped
+    """
+
+    def __init__(self, host, port, use_ssl, starttls, username, password, timeout=30):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.smtp = None
+
+    def connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+
+        try:
+            # Local stand-ins usually don't need to login
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except:
+            smtp.close()
+            raise
+
+        self.smtp = smtp
+        logging.info(f'Connected to SMTP server {self.host}:{self.port}')
+
+    def alive(self):
+        try:
+            return self.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message):
+        # Servers drop idle connections, so make sure that it's still there first
+        if self.smtp != None and not self.alive():
+            self.close()
+
+        if self.smtp == None:
+            self.connect()
+
+        self.smtp.send_message(message)
+
+    def close(self):
+        if self.smtp == None:
+            return
+
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+
+        self.smtp = None
+
+class Notifier:
+    """
+    Background dispatcher that delivers the new-product emails off of the GUI thread. Batches that arrive
+    within a short window of each other are merged into a single digest, failed sends are retried with
+    exponential backoff, and the SMTP session is kept open between sends.
+    """
+
+    def __init__(self, callback=None, idle_secs=5 * 60):
+        # Called with (ok, message) from the dispatcher thread after each digest
+        self.callback = callback
+        self.idle_secs = idle_secs
+
+        self.batches = queue.Queue()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.session = None
+        self.session_key = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.run, name='Notifier', daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stops the dispatcher, giving it a chance to send off anything that is still pending
+        """
+
+        if self.thread == None:
+            # Digests might have been delivered directly, without the dispatcher thread
+            if self.session != None:
+                self.session.close()
+
+            return
+
+        self.stopping.set()
+        self.batches.put(None)
+        self.thread.join(timeout)
+        self.thread = None
+
+    def submit(self, total_products):
+        """
+        Queues up the new products of each query (keyed by the query's name) to be emailed
+        """
+
+        self.batches.put(total_products)
+
+    def merge(self, digest, total_products):
+        for query, products in total_products.items():
+            merged = digest.setdefault(query, [])
+
+            # The same product might show up in several batches
+            ids = {product.id for product in merged}
+            merged.extend(product for product in products if product.id not in ids)
+
+    def run(self):
+        running = True
+
+        while running:
+            try:
+                batch = self.batches.get(timeout=self.idle_secs)
+            except queue.Empty:
+                # Don't keep the connection open while there's nothing to send
+                if self.session != None:
+                    self.session.close()
+
+                continue
+
+            if batch == None:
+                break
+
+            # Wait a little for any more batches, so that they all go out in a single email
+            digest = {}
+            self.merge(digest, batch)
+            deadline = time.monotonic() + config.email_merge_secs
+
+            while True:
+                try:
+                    batch = self.batches.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+
+                if batch == None:
+                    running = False
+                    break
+
+                self.merge(digest, batch)
+
+            # Never let a bad digest take down the dispatcher
+            try:
+                self.deliver(digest)
+            except Exception as e:
+                logging.exception(f'Failed to build or send email: {e}')
+                self.report(False, f'Failed to send email to {config.to_email}')
+
+        if self.session != None:
+            self.session.close()
+
+    def get_session(self):
+        """
+        Grabs the SMTP session, starting a new one if the email settings have changed
+        """
+
+        key = (config.smtp_host, config.smtp_port, config.smtp_ssl, config.smtp_starttls, config.from_email, config.from_password)
+
+        if self.session == None or key != self.session_key:
+            if self.session != None:
+                self.session.close()
+
+            self.session = SmtpSession(*key)
+            self.session_key = key
+
+        return self.session
+
+    def deliver(self, digest):
+        """
+        Sends a digest, retrying with exponential backoff, and reports how it went
+        """
+
+        total_found = sum(len(products) for products in digest.values())
+        messages = build_messages(digest)
+        sent = 0
+
+        for attempt in range(config.email_retries + 1):
+            try:
+                # Large digests are split over several emails, so pick up where the last attempt left off
+                while sent < len(messages):
+                    self.get_session().send(messages[sent])
+                    sent += 1
+
+                logging.info(f'Sent {len(messages)} emails with {total_found} products to {config.to_email}')
+                self.report(True, f'Email sent with {total_found} new products')
+                return True
+
+            except (smtplib.SMTPException, OSError) as e:
+                self.session.close()
+                logging.warning(f'Failed to send email from {config.from_email} to {config.to_email} (attempt {attempt + 1}): {e}')
+
+                # There's no point in retrying with the wrong password
+                if isinstance(e, smtplib.SMTPAuthenticationError):
+                    break
+
+                delay = min(config.email_backoff_secs * 2 ** attempt, config.email_max_backoff_secs)
+
+                # Give up on waiting when stopping, as there's nobody left to wait for
+                if attempt == config.email_retries or self.stopping.wait(delay):
+                    break
+
+        logging.error(f'Failed to send email from {config.from_email} to {config.to_email}')
+        self.report(False, f'Failed to send email to {config.to_email}')
+        return False
+
+    def report(self, ok, message):
+        if self.callback != None:
+            try:
+                self.callback(ok, message)
+            except Exception as e:
+                logging.exception(f'Notification callback failed: {e}')
@@ -0,0 +1,167 @@
+from html.parser import HTMLParser
+import logging, re
+
+# Use lxml's C-backed parser if it's available, otherwise fall back to a streaming pure-Python one
+try:
+    from lxml import etree, html as lxml_html
+except ImportError:
+    lxml_html = None
+
+# Extracts the ID of a product from it's URL
+ID_RE = re.compile(r'^.+/(\d+)\.html$')
+
+# Start of the results containers, and of the nearby results banner/separator that we stop at
+RESULTS1_RE = re.compile(r'<ul\b[^>]*\bid=["\']?search-results["\'\s>]', re.I)
+RESULTS2_RE = re.compile(r'<div\b[^>]*\bid=["\']?search-results-page-1["\'\s>]', re.I)
+NEARBY1_RE = re.compile(r'<h4\b[^>]*\bclass=["\']ban nearby["\']', re.I)
+NEARBY2_RE = re.compile(r'<li\b[^>]*\bclass=["\'][^"\']*\bnearby-separator\b', re.I)
+
+# Opening and closing tags, used to find where the containers end
+TAG_RES = {
+    'ul': re.compile(r'<(/?)ul\b', re.I),
+    'div': re.compile(r'<(/?)div\b', re.I),
+}
+
+if lxml_html != None:
+    ROWS1_XPATH = etree.XPath('.//li[contains(concat(" ", normalize-space(@class), " "), " result-row ")]')
+    LINK1_XPATH = etree.XPath('(.//a[@class="result-title hdrlnk"])[1]')
+    ROWS2_XPATH = etree.XPath('.//li[contains(concat(" ", normalize-space(@class), " "), " cl-search-result ")]')
+    LINK2_XPATH = etree.XPath('(.//a[contains(concat(" ", normalize-space(@class), " "), " titlestring ")])[1]')
+
+def find_results(source, start_re, tag, stop_re):
+    """
+    Cuts the results container out of the page's source, so that we don't have to parse the whole page,
+    stopping at the nearby results if there are any. Returns None if the page has no results container.
+    """
+
+    match = start_re.search(source)
+    if match == None:
+        return None
+
+    start = match.start()
+    end = len(source)
+    depth = 0
+
+    # Find the matching closing tag, keeping track of any nested tags of the same type
+    for tag_match in TAG_RES[tag].finditer(source, start):
+        depth += -1 if tag_match.group(1) else 1
+
+        if depth == 0:
+            end = tag_match.end()
+            break
+
+    # Stop at the nearby results
+    stop = stop_re.search(source, start, end)
+    if stop != None:
+        end = stop.start()
+
+    return source[start:end]
+
+class RowParser(HTMLParser):
+    """
+    Streaming parser that pulls the first matching link out of every result row, without building a tree
+    """
+
+    def __init__(self, row_class, link_matches):
+        super().__init__()
+
+        self.row_class = row_class
+        self.link_matches = link_matches
+
+        self.rows = []
+        self.in_row = False
+        self.link = None
+        self.text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'li':
+            # Keep track of whether we are in a result row or not
+            for name, value in attrs:
+                if name == 'class':
+                    self.in_row = value != None and self.row_class in value.split()
+                    break
+            else:
+                self.in_row = False
+
+        elif tag == 'a' and self.in_row and self.link == None:
+            attrs = dict(attrs)
+
+            if self.link_matches(attrs.get('class') or ''):
+                self.link = attrs
+                self.text = []
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self.link != None:
+            self.rows.append((self.link, ''.join(self.text)))
+            self.link = None
+
+            # Only use the first link of each row
+            self.in_row = False
+
+    def handle_data(self, data):
+        if self.link != None:
+            self.text.append(data)
+
+def links_lxml(fragment, rows_xpath, link_xpath):
+    root = lxml_html.fragment_fromstring(fragment, create_parent='div')
+    links = []
+
+    for row in rows_xpath(root):
+        link = link_xpath(row)
+
+        if link:
+            links.append((link[0].attrib, str(link[0].text_content())))
+
+    return links
+
+def links_python(fragment, row_class, link_matches):
+    parser = RowParser(row_class, link_matches)
+    parser.feed(fragment)
+    parser.close()
+
+    return parser.rows
+
+def parse_page1(source, use_lxml=True):
+    """
+    Parses a page using the 'result-row' layout, returning a list of (id, name, url) tuples
+    """
+
+    fragment = find_results(source, RESULTS1_RE, 'ul', NEARBY1_RE)
+    if fragment == None:
+        raise Exception('Unable to find the search results')
+
+    if use_lxml and lxml_html != None:
+        links = links_lxml(fragment, ROWS1_XPATH, LINK1_XPATH)
+    else:
+        links = links_python(fragment, 'result-row', lambda classes: classes == 'result-title hdrlnk')
+
+    return [(link.get('data-id'), name, link.get('href')) for link, name in links]
+
+def parse_page2(source, use_lxml=True):
+    """
+    Parses a page using the 'cl-search-result' layout, returning a list of (id, name, url) tuples
+    """
+
+    fragment = find_results(source, RESULTS2_RE, 'div', NEARBY2_RE)
+    if fragment == None:
+        raise Exception('Unable to find the search results')
+
+    if use_lxml and lxml_html != None:
+        links = links_lxml(fragment, ROWS2_XPATH, LINK2_XPATH)
+    else:
+        links = links_python(fragment, 'cl-search-result', lambda classes: 'titlestring' in classes.split())
+
+    rows = []
+
+    for link, name in links:
+        url = link.get('href')
+
+        # Make sure that we were able to extract an ID
+        id = ID_RE.match(url or '')
+        if id == None:
+            logging.error(f'Unable to extract ID from URL {url}, skipping')
+            continue
+
+        rows.append((id.group(1), name, url))
+
+    return rows
@@ -0,0 +1,54 @@
+import collections, itertools
+
+class CrawlJob:
+    """
+    A single result set to crawl, along with all of the queries that share it
+    """
+
+    def __init__(self, url, queries):
+        self.url = url
+        self.queries = queries
+
+    @property
+    def area(self):
+        return self.queries[0].area
+
+    @property
+    def section(self):
+        return self.queries[0].section
+
+def plan_crawls(queries, due=None):
+    """
+    Plans the crawls of an update. Queries that end up at the same URL are coalesced into a single job,
+    so that each distinct result set only gets fetched once, and the jobs of the different areas are
+    interleaved so that the crawler threads don't all end up waiting on the same host's rate limit.
+    When only some of the queries are due, any query that is due pulls in the others that share it's URL.
+    """
+
+    jobs = {}
+
+    # Ignore any empty searches
+    for query in queries:
+        if len(query.query.strip()) == 0:
+            continue
+
+        url = query.url()
+        if url not in jobs:
+            jobs[url] = CrawlJob(url, [])
+
+        jobs[url].queries.append(query)
+
+    if due != None:
+        jobs = {url: job for url, job in jobs.items() if any(query.id in due for query in job.queries)}
+
+    # Group the jobs by area and section
+    areas = collections.defaultdict(list)
+    for job in sorted(jobs.values(), key=lambda job: (job.area, job.section, job.url)):
+        areas[job.area].append(job)
+
+    # Then take turns between the areas
+    plan = []
+    for jobs in itertools.zip_longest(*areas.values()):
+        plan.extend(job for job in jobs if job != None)
+
+    return plan
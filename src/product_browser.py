@@ -0,0 +1,283 @@
+import time
+
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+from PyQt5.QtGui import *
+
+class ProductPageModel(QAbstractTableModel):
+    """
+    Lazily loaded table of the products of a query, which only fetches the next page of products
+    from the database once the view has scrolled down to them
+    """
+
+    headers = ['Name', 'Found', 'Seen']
+    NAME, FOUND, SEEN = range(3)
+
+    # Number of products fetched at a time
+    page_size = 200
+
+    def __init__(self, db, query_url, parent=None):
+        super().__init__(parent)
+
+        self.db = db
+        self.query_url = query_url
+        self.order = 'found'
+        self.descending = True
+
+        self.products = []
+        self.more = True
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.products)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(ProductPageModel.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ProductPageModel.headers[section]
+
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        product = self.products[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == ProductPageModel.NAME:
+                return product.name
+
+            value = product.found if column == ProductPageModel.FOUND else product.seen
+            return str(value)
+
+        if role == Qt.ToolTipRole and column == ProductPageModel.NAME:
+            return product.url
+
+        if role == Qt.ForegroundRole and column == ProductPageModel.NAME:
+            return QBrush(QColor(103, 0, 103))
+
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.more
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+
+        # Carry on from the last product that we have
+        after = None
+        if self.products:
+            last = self.products[-1]
+            after = (last.found if self.order == 'found' else last.seen, last.id)
+
+        products = self.db.get_products_page(self.query_url, self.order, self.descending, after, ProductPageModel.page_size)
+        self.more = len(products) == ProductPageModel.page_size
+
+        if products:
+            self.beginInsertRows(QModelIndex(), len(self.products), len(self.products) + len(products) - 1)
+            self.products.extend(products)
+            self.endInsertRows()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Only the dates can be sorted on, as that's what the database has indexes for
+        if column == ProductPageModel.NAME:
+            return
+
+        self.beginResetModel()
+        self.order = 'found' if column == ProductPageModel.FOUND else 'seen'
+        self.descending = order == Qt.DescendingOrder
+        self.products = []
+        self.more = True
+        self.endResetModel()
+
+        # Fill up the first page straight away
+        self.fetchMore()
+
+    def product(self, row):
+        return self.products[row]
+
+class ProductBrowser(QDialog):
+    """
+    Dialog for browsing through all of the products that a query has found
+    """
+
+    def __init__(self, db, query, parent=None):
+        super().__init__(parent)
+
+        self.setWindowTitle(f'Products found by {query.name()} ({db.get_num_products(query.url())} products)')
+        self.setMinimumSize(600, 600)
+
+        self.model = ProductPageModel(db, query.url(), self)
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setWordWrap(False)
+        self.view.verticalHeader().hide()
+
+        # Every row is the same height, so the view doesn't need to measure them
+        self.view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.view.verticalHeader().setDefaultSectionSize(self.view.fontMetrics().height() + 6)
+
+        header = self.view.horizontalHeader()
+        header.setSectionResizeMode(ProductPageModel.NAME, QHeaderView.Stretch)
+
+        # Size the date columns up front, instead of measuring every row
+        date_width = self.view.fontMetrics().horizontalAdvance('0000-00-00 00:00:00') + 24
+        header.resizeSection(ProductPageModel.FOUND, date_width)
+        header.resizeSection(ProductPageModel.SEEN, date_width)
+
+        # Newest products first
+        self.view.setSortingEnabled(True)
+        self.view.sortByColumn(ProductPageModel.FOUND, Qt.DescendingOrder)
+
+        # Open a product's listing when it's double-clicked
+        self.view.activated.connect(lambda index: QDesktopServices.openUrl(QUrl(self.model.product(index.row()).url)))
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok)
+        button_box.accepted.connect(self.accept)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.view)
+        layout.addWidget(button_box)
+        self.setLayout(layout)
+
+class ProductListModel(QAbstractTableModel):
+    """
+    Table of a fixed list of products, like search results
+    """
+
+    headers = ['Name', 'Query', 'Found', 'Seen']
+    NAME, QUERY, FOUND, SEEN = range(4)
+
+    def __init__(self, query_names, parent=None):
+        super().__init__(parent)
+
+        # Names of the queries by their URL
+        self.query_names = query_names
+        self.products = []
+
+    def set_products(self, products):
+        self.beginResetModel()
+        self.products = products
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.products)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(ProductListModel.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return ProductListModel.headers[section]
+
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        product = self.products[index.row()]
+        column = index.column()
+
+        if role == Qt.DisplayRole:
+            if column == ProductListModel.NAME:
+                return product.name
+            elif column == ProductListModel.QUERY:
+                return self.query_names.get(product.query, product.query)
+            elif column == ProductListModel.FOUND:
+                return str(product.found)
+            else:
+                return str(product.seen)
+
+        if role == Qt.ToolTipRole and column == ProductListModel.NAME:
+            return product.url
+
+        if role == Qt.ForegroundRole and column == ProductListModel.NAME:
+            return QBrush(QColor(103, 0, 103))
+
+        return None
+
+    def product(self, row):
+        return self.products[row]
+
+class SearchDialog(QDialog):
+    """
+    Dialog for searching through the names of all the stored products, which searches as you type
+    """
+
+    # Number of results shown
+    limit = 200
+
+    def __init__(self, db, text='', parent=None):
+        super().__init__(parent)
+
+        self.db = db
+
+        self.setWindowTitle('Search Products')
+        self.setMinimumSize(700, 600)
+
+        self.search = QLineEdit(text)
+        self.search.setPlaceholderText('Search all products...')
+        self.search.setClearButtonEnabled(True)
+
+        # Wait for a short pause in typing before searching
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(150)
+        self.timer.timeout.connect(self.run_search)
+        self.search.textChanged.connect(lambda: self.timer.start())
+
+        self.status = QLabel()
+
+        self.model = ProductListModel({query.url(): query.name() for query in db.get_queries()}, self)
+
+        self.view = QTableView()
+        self.view.setModel(self.model)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.view.setWordWrap(False)
+        self.view.verticalHeader().hide()
+
+        header = self.view.horizontalHeader()
+        header.setSectionResizeMode(ProductListModel.NAME, QHeaderView.Stretch)
+
+        # Size the other columns up front, instead of measuring every row
+        date_width = self.view.fontMetrics().horizontalAdvance('0000-00-00 00:00:00') + 24
+        header.resizeSection(ProductListModel.QUERY, 160)
+        header.resizeSection(ProductListModel.FOUND, date_width)
+        header.resizeSection(ProductListModel.SEEN, date_width)
+
+        # Open a product's listing when it's double-clicked
+        self.view.activated.connect(lambda index: QDesktopServices.openUrl(QUrl(self.model.product(index.row()).url)))
+
+        button_box = QDialogButtonBox(QDialogButtonBox.Ok)
+        button_box.accepted.connect(self.accept)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.search)
+        layout.addWidget(self.view)
+        layout.addWidget(self.status)
+        layout.addWidget(button_box)
+        self.setLayout(layout)
+
+        self.run_search()
+
+    def run_search(self):
+        start = time.perf_counter()
+        products = self.db.search_products(self.search.text(), SearchDialog.limit)
+        elapsed = time.perf_counter() - start
+
+        self.model.set_products(products)
+
+        if self.search.text().strip():
+            more = '+' if len(products) == SearchDialog.limit else ''
+            self.status.setText(f'{len(products)}{more} products found in {elapsed * 1000:.0f}ms')
+        else:
+            self.status.setText('')
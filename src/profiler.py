@@ -0,0 +1,165 @@
+import os, sys, time, threading, logging, contextlib, collections, cProfile
+
+class CycleProfiler:
+    """
+    Profiles the next few update cycles on demand. Each crawl job gets profiled with cProfile on it's
+    crawler thread, and all of the threads taking part in the cycle are sampled every so often to build
+    a collapsed-stack file that flame graph tools can read, with the stacks tagged by their query IDs.
+    Nothing gets hooked in while there's nothing to profile.
+    """
+
+    def __init__(self, dir, interval=0.005):
+        self.dir = dir
+        self.interval = interval
+
+        self.lock = threading.Lock()
+        self.cycles_left = 0
+
+        # What each thread that is being sampled is working on, and how often each stack was seen
+        self.tags = {}
+        self.stacks = collections.Counter()
+
+        self.cycle_dir = None
+        self.cycle_profile = None
+        self.sampling = None
+        self.sampler = None
+
+    def arm(self, cycles):
+        """
+        Profiles the next number of update cycles
+        """
+
+        with self.lock:
+            self.cycles_left = cycles
+
+        logging.info(f'Profiling the next {cycles} update cycles into {self.dir}')
+
+    def start_cycle(self):
+        """
+        Starts profiling the current cycle on this thread, returning whether it's being profiled
+        """
+
+        with self.lock:
+            if self.cycles_left <= 0:
+                return False
+
+            self.cycles_left -= 1
+
+        # Cycles can be quick when replaying, so make sure that they don't overwrite each other
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        self.cycle_dir = os.path.join(self.dir, stamp)
+
+        count = 1
+        while os.path.exists(self.cycle_dir):
+            count += 1
+            self.cycle_dir = os.path.join(self.dir, f'{stamp}-{count}')
+
+        # A profile isn't worth failing the update over, e.g. when the disk is full
+        try:
+            os.makedirs(self.cycle_dir)
+        except OSError as e:
+            logging.error(f'Unable to profile the update cycle, as {self.cycle_dir} could not be created: {e}')
+            return False
+
+        self.stacks = collections.Counter()
+        self.tags = {threading.get_ident(): 'cycle'}
+
+        self.sampling = threading.Event()
+        self.sampler = threading.Thread(target=self.sample, args=(self.sampling,), name='Profiler', daemon=True)
+        self.sampler.start()
+
+        self.cycle_profile = self.enable()
+        return True
+
+    def end_cycle(self):
+        """
+        Stops profiling the cycle, and writes out what was found
+        """
+
+        self.sampling.set()
+        self.sampler.join()
+        self.dump(self.cycle_profile, 'cycle')
+
+        with self.lock:
+            stacks = sorted(self.stacks.items())
+            self.tags = {}
+
+        try:
+            with open(os.path.join(self.cycle_dir, 'stacks.folded'), 'w') as f:
+                for stack, count in stacks:
+                    f.write(f'{stack} {count}\n')
+        except OSError as e:
+            logging.error(f'Unable to write the profile of the update cycle: {e}')
+            return
+
+        logging.info(f'Wrote the profile of the update cycle to {self.cycle_dir}')
+
+    @contextlib.contextmanager
+    def job(self, query_ids):
+        """
+        Profiles a crawl job on the current thread, tagging it with the IDs of it's queries
+        """
+
+        tag = 'queries ' + ','.join(str(id) for id in sorted(query_ids))
+
+        with self.lock:
+            self.tags[threading.get_ident()] = tag
+
+        profile = self.enable()
+
+        try:
+            yield
+        finally:
+            if profile != None:
+                profile.disable()
+
+            with self.lock:
+                self.tags.pop(threading.get_ident(), None)
+
+            self.dump(profile, tag.replace(' ', '-').replace(',', '-'))
+
+    def enable(self):
+        # Newer versions of Python only allow a single profiler at a time, in which case the stacks still get sampled
+        profile = cProfile.Profile()
+
+        try:
+            profile.enable()
+        except ValueError as e:
+            logging.warning(f'Unable to start cProfile, only sampling instead: {e}')
+            return None
+
+        return profile
+
+    def dump(self, profile, name):
+        if profile == None:
+            return
+
+        profile.disable()
+
+        try:
+            profile.dump_stats(os.path.join(self.cycle_dir, f'{name}.prof'))
+        except OSError as e:
+            logging.error(f'Unable to write the {name} profile: {e}')
+
+    def sample(self, stop):
+        """
+        Sampler thread, which records the stacks of all of the threads that are being profiled
+        """
+
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+
+            with self.lock:
+                for ident, tag in self.tags.items():
+                    frame = frames.get(ident)
+                    if frame == None:
+                        continue
+
+                    # Collapsed stacks go from the outermost frame inwards, separated by semicolons
+                    names = []
+                    while frame != None:
+                        code = frame.f_code
+                        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':'))
+                        frame = frame.f_back
+
+                    self.stacks[';'.join([tag] + names[::-1])] += 1
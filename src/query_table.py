@@ -0,0 +1,227 @@
+import time
+
+from PyQt5.QtCore import *
+from PyQt5.QtWidgets import *
+from PyQt5.QtGui import *
+
+from db import Query
+
+class QueryTableModel(QAbstractTableModel):
+    """
+    Table model of all the queries, which loads the queries and their product counts with a single
+    query each, and only tells the view about the cells that actually changed when it's refreshed
+    """
+
+    headers = ['Area', 'Section', 'Query', 'Email', 'Alarm', 'Found', 'Next Run']
+    AREA, SECTION, QUERY, EMAIL, ALARM, FOUND, NEXT_RUN = range(7)
+
+    tooltips = [
+        'Craigslist search area',
+        'Craigslist section',
+        'Search query for Craigslist',
+        'Enable/Disable sending email alerts',
+        'Enable/Disable sounding an alarm',
+        'Number of items found, in green if any were found in the last update (click to list them)',
+        'When the query is going to be updated next',
+    ]
+
+    def __init__(self, db, scheduler, parent=None):
+        super().__init__(parent)
+
+        self.db = db
+        self.scheduler = scheduler
+        self.editable = False
+
+        self.queries = []
+        self.counts = {}
+        self.cells = []
+
+        # Number of products that each query ID found in the last update, and which query URLs failed
+        self.found = {}
+        self.failed = set()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.queries)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(QueryTableModel.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return QueryTableModel.headers[section]
+
+        return None
+
+    def render(self, query):
+        """
+        Grabs everything that's shown for a query, so that refreshes can tell which cells have changed
+        """
+
+        next_run = self.scheduler.next_run(query.id)
+
+        # Show when the query is going to be updated next
+        if next_run == None:
+            next_run_text = ''
+        elif next_run <= time.time():
+            next_run_text = 'Now'
+        else:
+            next_run_text = time.strftime('%H:%M:%S', time.localtime(next_run))
+
+        failed = query.url() in self.failed
+
+        return [
+            (query.area, failed),
+            (query.section, failed),
+            (query.query, failed),
+            (query.email, False),
+            (query.alarm, False),
+            (self.counts.get(query.url(), 0), self.found.get(query.id, 0) > 0),
+            (next_run_text, False),
+        ]
+
+    def refresh(self):
+        """
+        Reloads the queries and their product counts
+        """
+
+        queries = self.db.get_queries()
+        self.counts = self.db.get_product_counts([query.url() for query in queries])
+
+        # Only start over if queries were added or removed
+        if [query.id for query in queries] != [query.id for query in self.queries]:
+            self.beginResetModel()
+            self.queries = queries
+            self.cells = [self.render(query) for query in queries]
+            self.endResetModel()
+            return
+
+        self.queries = queries
+
+        for row, query in enumerate(queries):
+            cells = self.render(query)
+            changed = [column for column in range(len(cells)) if cells[column] != self.cells[row][column]]
+            self.cells[row] = cells
+
+            if changed:
+                self.dataChanged.emit(self.index(row, changed[0]), self.index(row, changed[-1]))
+
+    def set_editable(self, editable):
+        self.editable = editable
+
+    def query(self, row):
+        return self.queries[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        query = self.queries[index.row()]
+        column = index.column()
+        value, flag = self.cells[index.row()][column]
+
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column in (QueryTableModel.EMAIL, QueryTableModel.ALARM):
+                return None
+
+            return value
+
+        if role == Qt.CheckStateRole and column in (QueryTableModel.EMAIL, QueryTableModel.ALARM):
+            return Qt.Checked if value else Qt.Unchecked
+
+        if role == Qt.ForegroundRole:
+            # Highlight failed queries in red, and queries that found something in green
+            if column in (QueryTableModel.AREA, QueryTableModel.SECTION, QueryTableModel.QUERY) and flag:
+                return QBrush(Qt.red)
+
+            if column == QueryTableModel.FOUND and flag:
+                return QBrush(Qt.darkGreen)
+
+        if role == Qt.TextAlignmentRole and column in (QueryTableModel.FOUND, QueryTableModel.NEXT_RUN):
+            return Qt.AlignCenter
+
+        if role == Qt.ToolTipRole:
+            return QueryTableModel.tooltips[column]
+
+        return None
+
+    def flags(self, index):
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+        if not self.editable:
+            return flags
+
+        if index.column() in (QueryTableModel.AREA, QueryTableModel.SECTION, QueryTableModel.QUERY):
+            flags |= Qt.ItemIsEditable
+        elif index.column() in (QueryTableModel.EMAIL, QueryTableModel.ALARM):
+            flags |= Qt.ItemIsUserCheckable
+
+        return flags
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or not self.editable:
+            return False
+
+        row = index.row()
+        column = index.column()
+        query = self.queries[row]
+
+        # Update the query in the database
+        if role == Qt.EditRole and column == QueryTableModel.AREA:
+            query.area = value
+        elif role == Qt.EditRole and column == QueryTableModel.SECTION:
+            query.section = value
+        elif role == Qt.EditRole and column == QueryTableModel.QUERY:
+            query.query = value
+        elif role == Qt.CheckStateRole and column == QueryTableModel.EMAIL:
+            query.email = value == Qt.Checked
+        elif role == Qt.CheckStateRole and column == QueryTableModel.ALARM:
+            query.alarm = value == Qt.Checked
+        else:
+            return False
+
+        self.db.update_query(query)
+
+        # Changing the URL changes which products belong to the query
+        url = query.url()
+        if url not in self.counts:
+            self.counts.update(self.db.get_product_counts([url]))
+
+        self.cells[row] = self.render(query)
+        self.dataChanged.emit(self.index(row, 0), self.index(row, len(QueryTableModel.headers) - 1))
+
+        return True
+
+class AreaDelegate(QStyledItemDelegate):
+    """
+    Edits the area of a query, which can only be made up of letters
+    """
+
+    def createEditor(self, parent, option, index):
+        # Setup the area validator
+        re = QRegularExpression('[a-z]*')
+        re.setPatternOptions(QRegularExpression.CaseInsensitiveOption)
+
+        editor = QLineEdit(parent)
+        editor.setValidator(QRegularExpressionValidator(re, editor))
+
+        return editor
+
+class SectionDelegate(QStyledItemDelegate):
+    """
+    Picks the section of a query from the known Craigslist sections
+    """
+
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(Query.sections.keys())
+
+        # Commit as soon as a section is picked, instead of waiting for the editor to lose focus
+        editor.activated.connect(lambda: self.commitData.emit(editor))
+
+        return editor
+
+    def setEditorData(self, editor, index):
+        editor.setCurrentText(index.data(Qt.EditRole))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.EditRole)
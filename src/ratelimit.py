@@ -0,0 +1,71 @@
+import threading, time, urllib.parse
+
+class TokenBucket:
+    """
+    Classic token bucket, allowing bursts of up to `burst` requests and `rate` requests per second after that
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """
+        Takes a token, returning how many seconds the caller must wait before using it
+        """
+
+        with self.lock:
+            now = time.monotonic()
+
+            # Refill the bucket for the time that has passed
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # Take a token, possibly going into debt which will be paid off by waiting
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+
+            return -self.tokens / self.rate
+
+    def acquire(self, interrupted=lambda: False):
+        """
+        Blocks until a token is available, or until interrupted
+        """
+
+        delay = self.reserve()
+        end = time.monotonic() + delay
+
+        # Sleep in small steps so that we can still be interrupted
+        while delay > 0 and not interrupted():
+            time.sleep(min(delay, 0.25))
+            delay = end - time.monotonic()
+
+class HostRateLimiter:
+    """
+    Keeps a separate token bucket for every host, so that no single Craigslist area gets hammered
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, url, interrupted=lambda: False):
+        """
+        Blocks until we are allowed to make another request to the host of a URL
+        """
+
+        host = urllib.parse.urlsplit(url).netloc
+
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(self.rate, self.burst)
+
+            bucket = self.buckets[host]
+
+        bucket.acquire(interrupted)
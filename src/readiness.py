@@ -0,0 +1,151 @@
+import time, threading, logging, collections, re
+
+# Grabs everything needed to tell if a results page is ready, in a single round trip to the browser
+STATE_SCRIPT = '''
+var results1 = document.getElementById('search-results');
+var results2 = document.getElementById('search-results-page-1');
+var rows2 = results2 ? results2.querySelectorAll('li.cl-search-result') : [];
+
+function rowId(row) {
+    if (!row)
+        return '';
+
+    var link = row.querySelector('a');
+    return row.getAttribute('data-pid') || (link ? link.getAttribute('href') : '') || '';
+}
+
+return {
+    url: location.href,
+    loading: document.readyState == 'loading',
+    results1: results1 != null,
+    rows2: results2 ? rows2.length : -1,
+    fingerprint: rowId(rows2[0]) + '|' + rowId(rows2[rows2.length - 1])
+};
+'''
+
+# Matches the hash that the 'cl-search-result' layout sets once it has rendered the results
+SEARCH_HASH_RE = re.compile(r'#search=\d+~.+~\d+~\d+$')
+
+class Readiness:
+    """
+    Waits for result pages to be ready to parse by polling the DOM conditions of each layout, instead
+    of sleeping for a fixed amount of time. Keeps track of how long each kind of wait takes.
+    """
+
+    def __init__(self, timeout=10, poll_secs=0.05, stable_polls=3, history=500):
+        self.timeout = timeout
+        self.poll_secs = poll_secs
+        self.stable_polls = stable_polls
+
+        self.lock = threading.Lock()
+        self.waits = collections.defaultdict(lambda: collections.deque(maxlen=history))
+        self.timeouts = collections.Counter()
+
+    def wait(self, driver, name, ready):
+        """
+        Polls the page's state until ready(state) is true or we time out, returning the time waited
+        """
+
+        start = time.perf_counter()
+        timed_out = True
+
+        while time.perf_counter() - start < self.timeout:
+            if ready(driver.execute_script(STATE_SCRIPT)):
+                timed_out = False
+                break
+
+            time.sleep(self.poll_secs)
+
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.waits[name].append(elapsed)
+
+            if timed_out:
+                self.timeouts[name] += 1
+
+        if timed_out:
+            logging.warning(f'Timed out after {elapsed:.1f}s waiting for {name} of {driver.current_url}')
+
+        return elapsed
+
+    def rows_stable(self):
+        """
+        Creates a check for the 'cl-search-result' layout's rows having stopped changing
+        """
+
+        counts = []
+
+        def stable(rows):
+            counts.append(rows)
+            return len(counts) >= self.stable_polls and len(set(counts[-self.stable_polls:])) == 1
+
+        return stable
+
+    def wait_loaded(self, driver):
+        """
+        Waits for a freshly loaded page to show it's results, with either of the layouts
+        """
+
+        stable = self.rows_stable()
+
+        def ready(state):
+            # The 'result-row' layout is rendered server-side, so it's ready as soon as the container exists
+            if state['results1'] and not state['loading']:
+                return True
+
+            # The other one is ready once it has set the search hash and has stopped adding rows
+            return SEARCH_HASH_RE.search(state['url']) != None and state['rows2'] >= 0 and stable(state['rows2'])
+
+        return self.wait(driver, 'load', ready)
+
+    def fingerprint(self, driver):
+        """
+        Grabs the IDs of the first and last rows of the 'cl-search-result' layout, to tell it's pages apart
+        """
+
+        return driver.execute_script(STATE_SCRIPT)['fingerprint']
+
+    def wait_page_turn(self, driver, old_url, old_fingerprint):
+        """
+        Waits for the 'cl-search-result' layout to show the next page after clicking it's next button
+        """
+
+        stable = self.rows_stable()
+
+        def ready(state):
+            # The hash can change before the new rows are rendered, and the old rows are already stable, so the rows have to change too
+            if state['url'] == old_url or state['rows2'] < 0 or state['fingerprint'] == old_fingerprint:
+                return False
+
+            return stable((state['rows2'], state['fingerprint']))
+
+        return self.wait(driver, 'page turn', ready)
+
+    def reset(self):
+        """
+        Forgets about the earlier waits, so that the summary only covers the current cycle
+        """
+
+        with self.lock:
+            self.waits.clear()
+            self.timeouts.clear()
+
+    def summary(self):
+        """
+        Summarizes how long each kind of wait has been taking since the last reset, for tuning
+        """
+
+        with self.lock:
+            parts = []
+
+            for name, waits in self.waits.items():
+                ordered = sorted(waits)
+                p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+                parts.append(
+                    f'{name}: {len(ordered)} waits, mean {sum(ordered) / len(ordered):.2f}s, '
+                    f'p95 {p95:.2f}s, max {ordered[-1]:.2f}s, {self.timeouts[name]} timeouts'
+                )
+
+            return '; '.join(parts)
@@ -0,0 +1,174 @@
+import gzip, json, time, threading, logging
+
+from db import Query
+
+class Recorder:
+    """
+    Records every page that the updater visits into a gzipped JSON-lines archive, which can later
+    be replayed without a browser or network access
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = None
+        self.cycle = 0
+
+    def start_cycle(self, queries):
+        """
+        Opens the archive for appending, and records the queries that this cycle is going to crawl
+        """
+
+        with self.lock:
+            self.file = gzip.open(self.path, 'at', encoding='utf-8')
+            self.cycle += 1
+
+        self.write({
+            'action': 'queries',
+            'queries': [[query.area, query.section, query.query, query.alarm, query.email, query.id] for query in queries]
+        })
+
+    def end_cycle(self):
+        with self.lock:
+            if self.file != None:
+                self.file.close()
+                self.file = None
+
+    def write(self, record):
+        record['cycle'] = self.cycle
+        record['time'] = time.time()
+
+        with self.lock:
+            if self.file != None:
+                self.file.write(json.dumps(record) + '\n')
+
+    def page(self, action, key, backend, elapsed, more=True):
+        """
+        Records the page that a backend ended up at after an action
+        """
+
+        self.write({
+            'action': action,
+            'key': key,
+            'more': more,
+            'final_url': backend.current_url if more else None,
+            'source': backend.page_source if more else None,
+            'elapsed': elapsed,
+        })
+
+class RecordingBackend:
+    """
+    Wraps a backend, recording every page that it loads
+    """
+
+    def __init__(self, backend, recorder):
+        self.backend = backend
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        # Pass through anything that isn't recorded
+        return getattr(self.backend, name)
+
+    @property
+    def current_url(self):
+        return self.backend.current_url
+
+    @property
+    def page_source(self):
+        return self.backend.page_source
+
+    def get(self, url):
+        start = time.perf_counter()
+        self.backend.get(url)
+        self.recorder.page('get', url, self.backend, time.perf_counter() - start)
+
+    def next_page(self, action, next_page):
+        key = self.backend.current_url
+
+        start = time.perf_counter()
+        more = next_page()
+        self.recorder.page(action, key, self.backend, time.perf_counter() - start, more)
+
+        return more
+
+    def next_page1(self):
+        return self.next_page('next1', self.backend.next_page1)
+
+    def next_page2(self):
+        return self.next_page('next2', self.backend.next_page2)
+
+class ReplayArchive:
+    """
+    Pages loaded from an archive that was made by a Recorder
+    """
+
+    def __init__(self, path):
+        self.pages = {}
+        self.queries = []
+        self.cycles = 0
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self.cycles = max(self.cycles, record['cycle'])
+
+                if record['action'] == 'queries':
+                    self.queries = [Query(*query) for query in record['queries']]
+                else:
+                    # Later recordings of the same page replace earlier ones
+                    self.pages[(record['action'], record['key'])] = record
+
+        logging.info(f'Loaded {len(self.pages)} pages over {self.cycles} cycles from {path}')
+
+    def page(self, action, key):
+        try:
+            return self.pages[(action, key)]
+        except KeyError:
+            raise Exception(f'Page {action} {key} was not recorded')
+
+class ReplayBackend:
+    """
+    Backend that serves the pages of a recorded archive, instead of going out to the network
+    """
+
+    name = 'replay'
+    cost = 0
+    can_page2 = True
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.record = None
+
+    @property
+    def current_url(self):
+        return self.record['final_url']
+
+    @property
+    def page_source(self):
+        return self.record['source']
+
+    def get(self, url):
+        self.record = self.archive.page('get', url)
+
+    def can_parse(self):
+        return True
+
+    def next_page(self, action):
+        record = self.archive.page(action, self.current_url)
+        if not record['more']:
+            return False
+
+        self.record = record
+        return True
+
+    def next_page1(self):
+        return self.next_page('next1')
+
+    def next_page2(self):
+        return self.next_page('next2')
+
+    def is_alive(self):
+        return True
+
+    def close(self):
+        pass
@@ -0,0 +1,68 @@
+import argparse, logging, os, sys, tempfile, time
+
+from config import config
+from db import DB
+from connection import connections
+from recorder import ReplayArchive
+from engine import Engine
+from send_email import build_emails
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays a recorded crawl archive without a browser or network access')
+    parser.add_argument('archive', help='archive recorded with checker.py --record')
+    parser.add_argument('--cycles', type=int, default=2, help='number of update cycles to run (default: %(default)s)')
+    parser.add_argument('--db', help='database to use, a fresh temporary one by default')
+    args = parser.parse_args()
+
+    archive = ReplayArchive(args.archive)
+
+    with tempfile.TemporaryDirectory() as dir:
+        # Never touch the real database unless told to
+        config.db_path = args.db or os.path.join(dir, 'replay.db')
+        db = DB(config.db_path)
+
+        # Setup the queries that were recorded, if the database doesn't have any
+        if not db.get_queries():
+            for query in archive.queries:
+                db.add_query(query)
+
+        engine = Engine(archive=archive)
+
+        for cycle in range(args.cycles):
+            start = time.perf_counter()
+            engine.run()
+            crawl_time = time.perf_counter() - start
+
+            # Build the notification, like the GUI would. (The run closed this thread's connection, so reopen it)
+            db = DB(config.db_path)
+            queries = {query.id: query for query in db.get_queries()}
+            email_products = {queries[id].name(): products for id, products in engine.total_products.items() if products}
+
+            start = time.perf_counter()
+            if email_products:
+                build_emails(email_products)
+            email_time = time.perf_counter() - start
+
+            new_products = sum(len(products) for products in engine.total_products.values())
+            failed = sum(1 for status in engine.query_statuses.values() if status != 'ok')
+
+            times = engine.metrics.last_cycle['times']
+
+            print(
+                f'Cycle {cycle + 1}: {len(engine.query_statuses)} queries ({failed} failed), {new_products} new products, '
+                f'crawl {crawl_time * 1000:.1f}ms (parse {times["parse"] * 1000:.1f}ms, db {times["db"] * 1000:.1f}ms), email {email_time * 1000:.1f}ms'
+            )
+
+        engine.close()
+        connections.close()
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level = logging.WARNING,
+        format = '%(asctime)s [%(levelname)s] %(message)s',
+        handlers = [
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+
+    main()
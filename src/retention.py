@@ -0,0 +1,65 @@
+import os, gzip, json, time, logging
+
+class ProductArchive:
+    """
+    Append-only archive of the products that have expired, as gzipped JSON lines with a file per month.
+    Every batch is written as it's own gzip member, so that a crash can't leave the earlier batches unreadable.
+    """
+
+    def __init__(self, dir):
+        self.dir = dir
+
+    def path(self):
+        return os.path.join(self.dir, time.strftime('products-%Y-%m.jsonl.gz'))
+
+    def write(self, records):
+        os.makedirs(self.dir, exist_ok=True)
+
+        with open(self.path(), 'ab') as f:
+            with gzip.GzipFile(fileobj=f, mode='wb') as archive:
+                for record in records:
+                    archive.write((json.dumps(record, default=str) + '\n').encode('utf-8'))
+
+            # Make sure that the batch is on disk before it gets deleted from the database
+            f.flush()
+            os.fsync(f.fileno())
+
+class Retention:
+    """
+    Deletes the products that haven't been seen for a while, optionally moving them into an archive first.
+    Only a few small batches get deleted each update cycle, so that the database's write lock is never held
+    for long and a big backlog gets spread over several cycles.
+    """
+
+    def __init__(self, days, batch_size, max_batches, archive=None):
+        self.days = days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.archive = archive
+
+    def run(self, db):
+        """
+        Deletes up to max_batches batches of expired rows, returning how many were deleted
+        """
+
+        # Keep everything forever if there's no limit
+        if self.days <= 0:
+            return 0
+
+        start = time.perf_counter()
+        total = 0
+        batches = 0
+
+        while batches < self.max_batches:
+            deleted = db.expire_products(self.days, self.batch_size, self.archive)
+            if deleted == 0:
+                break
+
+            total += deleted
+            batches += 1
+
+        if total:
+            archived = ' into the archive' if self.archive != None else ''
+            logging.info(f'Expired {total} rows{archived} in {batches} batches, taking {(time.perf_counter() - start) * 1000:.0f}ms')
+
+        return total
@@ -0,0 +1,152 @@
+import threading, time, heapq, collections
+
+class QuerySchedule:
+    """
+    Scheduling state of a single query
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_run = 0
+        self.last_run = None
+        self.rate = None
+        self.failures = 0
+
+class Scheduler:
+    """
+    Adaptive per-query scheduler. Keeps track of how often each query finds new listings and how often
+    it fails, re-polling busy queries more often and backing off of quiet and failing ones, while keeping
+    the total number of polls per hour within a global budget.
+    """
+
+    def __init__(self, base_secs, min_secs, max_secs, budget, smoothing=0.3):
+        self.base_secs = base_secs
+        self.min_secs = min_secs
+        self.max_secs = max_secs
+        self.budget = budget
+        self.smoothing = smoothing
+
+        self.lock = threading.Lock()
+        self.schedules = {}
+        self.polls = collections.deque()
+
+    def sync(self, queries):
+        """
+        Starts scheduling any new queries (which are due right away), and stops scheduling deleted or empty ones
+        """
+
+        ids = set()
+
+        with self.lock:
+            for query in queries:
+                if len(query.query.strip()) == 0:
+                    continue
+
+                ids.add(query.id)
+
+                if query.id not in self.schedules:
+                    self.schedules[query.id] = QuerySchedule(self.base_secs)
+
+            for id in list(self.schedules.keys()):
+                if id not in ids:
+                    del self.schedules[id]
+
+    def make_all_due(self):
+        """
+        Makes all of the queries due right away
+        """
+
+        with self.lock:
+            for schedule in self.schedules.values():
+                schedule.next_run = 0
+
+    def next_run(self, id):
+        """
+        Gets when a query will next be polled, or None if it's not scheduled
+        """
+
+        with self.lock:
+            schedule = self.schedules.get(id)
+            return schedule.next_run if schedule != None else None
+
+    def seconds_until_due(self, now=None):
+        """
+        Gets the number of seconds until the next query is due, or None if there are no queries
+        """
+
+        now = now or time.time()
+
+        with self.lock:
+            if not self.schedules:
+                return None
+
+            return max(min(schedule.next_run for schedule in self.schedules.values()) - now, 0)
+
+    def take_due(self, now=None):
+        """
+        Grabs the IDs of the queries that are due, most overdue first, as far as the fetch budget allows
+        """
+
+        now = now or time.time()
+
+        with self.lock:
+            # Forget about any polls that are over an hour old
+            while self.polls and self.polls[0] <= now - 60 * 60:
+                self.polls.popleft()
+
+            due = [(schedule.next_run, id) for id, schedule in self.schedules.items() if schedule.next_run <= now]
+
+            if self.budget > 0:
+                due = heapq.nsmallest(max(self.budget - len(self.polls), 0), due)
+            else:
+                due.sort()
+
+            for _, id in due:
+                # Push it back for now, in case the poll never gets recorded
+                self.schedules[id].next_run = now + self.schedules[id].interval
+                self.polls.append(now)
+
+            return [id for _, id in due]
+
+    def record(self, id, new_products, ok, now=None):
+        """
+        Records the result of polling a query, and schedules it's next poll
+        """
+
+        now = now or time.time()
+
+        with self.lock:
+            schedule = self.schedules.get(id)
+            if schedule == None:
+                return
+
+            elapsed = now - schedule.last_run if schedule.last_run != None else None
+            schedule.last_run = now
+
+            if not ok:
+                # Back off exponentially from failing queries
+                schedule.failures += 1
+                schedule.interval = min(self.base_secs * 2 ** schedule.failures, self.max_secs)
+
+            else:
+                schedule.failures = 0
+
+                # Keep track of a smoothed rate of new products per second. (The first poll finds all the existing products, so skip it)
+                if elapsed:
+                    sample = new_products / elapsed
+
+                    if schedule.rate == None:
+                        schedule.rate = sample
+                    else:
+                        schedule.rate = self.smoothing * sample + (1 - self.smoothing) * schedule.rate
+
+                if schedule.rate == None:
+                    schedule.interval = self.base_secs
+                elif schedule.rate == 0:
+                    # Gradually back off from queries that never find anything
+                    schedule.interval = min(schedule.interval * 2, self.max_secs)
+                else:
+                    # Aim to find about one new product per poll
+                    schedule.interval = min(max(1 / schedule.rate, self.min_secs), self.max_secs)
+
+            schedule.next_run = now + schedule.interval
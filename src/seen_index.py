@@ -0,0 +1,200 @@
+import array, bisect, heapq, itertools, threading, logging
+
+class BloomFilter:
+    """
+    Simple Bloom filter over integer IDs, used to answer "definitely not seen" without searching the index
+    """
+
+    def __init__(self, bits, hashes=4):
+        self.size = max(bits, 64)
+        self.hashes = hashes
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, id):
+        # Double hashing, using two cheap multiplicative hashes of the ID
+        h1 = (id * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        h2 = ((id * 0xC2B2AE3D27D4EB4F) & 0xFFFFFFFFFFFFFFFF) | 1
+
+        return [((h1 + i * h2) & 0xFFFFFFFFFFFFFFFF) % self.size for i in range(self.hashes)]
+
+    def add(self, id):
+        for pos in self.positions(id):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, id):
+        for pos in self.positions(id):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+
+        return True
+
+class SeenIndex:
+    """
+    In-memory index of the product IDs that a query has found, so that new products can be told apart
+    without going to SQLite. The IDs are kept in a sorted array of 64-bit integers, with a small set of
+    recent changes that gets merged in every once in a while, and an optional Bloom filter in front.
+    """
+
+    # Number of pending changes before they get merged into the sorted array
+    merge_threshold = 4096
+
+    def __init__(self, ids, bloom_min=1000000):
+        self.lock = threading.Lock()
+        self.ids = array.array('q', ids)
+        self.added = set()
+        self.removed = set()
+
+        # Only bother with the Bloom filter for very large histories
+        self.bloom_min = bloom_min
+        self.bloom = None
+        self.bloom_stale = 0
+        self.build_bloom()
+
+    def __len__(self):
+        return len(self.ids) + len(self.added) - len(self.removed)
+
+    def build_bloom(self):
+        if len(self.ids) < self.bloom_min:
+            self.bloom = None
+            return
+
+        # About 10 bits per ID, for a ~1% false positive rate
+        self.bloom = BloomFilter(len(self.ids) * 10)
+        for id in self.ids:
+            self.bloom.add(id)
+
+        self.bloom_stale = 0
+
+    def in_array(self, id):
+        i = bisect.bisect_left(self.ids, id)
+        return i < len(self.ids) and self.ids[i] == id
+
+    def contains(self, id):
+        with self.lock:
+            if id in self.added:
+                return True
+
+            if id in self.removed:
+                return False
+
+            if self.bloom != None and id not in self.bloom:
+                return False
+
+            return self.in_array(id)
+
+    def add(self, ids):
+        with self.lock:
+            for id in ids:
+                # If it was removed it's still in the array, so there's no need to add it again
+                if id in self.removed:
+                    self.removed.discard(id)
+                elif not self.in_array(id):
+                    self.added.add(id)
+
+                if self.bloom != None:
+                    self.bloom.add(id)
+
+            self.maybe_merge()
+
+    def remove(self, ids):
+        with self.lock:
+            for id in ids:
+                if id in self.added:
+                    self.added.discard(id)
+                elif self.in_array(id):
+                    self.removed.add(id)
+
+            self.maybe_merge()
+
+    def maybe_merge(self):
+        if len(self.added) + len(self.removed) < SeenIndex.merge_threshold:
+            return
+
+        # Merge all the pending changes into a new sorted array
+        removed = self.removed
+        kept = (id for id in self.ids if id not in removed)
+
+        self.bloom_stale += len(self.removed)
+        self.ids = array.array('q', heapq.merge(kept, sorted(self.added)))
+        self.added = set()
+        self.removed = set()
+
+        # The Bloom filter can't forget IDs, so rebuild it once a good part of it is stale
+        if self.bloom == None or self.bloom_stale > len(self.ids) // 4:
+            self.build_bloom()
+
+class QueryIndexes:
+    """
+    Seen indexes of all the query URLs of a database, as each query keeps track of it's own products
+    """
+
+    def __init__(self, bloom_min, generation=0):
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.bloom_min = bloom_min
+
+        # How many times products had been expired from the database when the indexes were loaded
+        self.generation = generation
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(index) for index in self.indexes.values())
+
+    def get(self, query):
+        with self.lock:
+            index = self.indexes.get(query)
+
+            if index == None:
+                index = self.indexes[query] = SeenIndex([], self.bloom_min)
+
+            return index
+
+class SeenIndexes:
+    """
+    Process-wide seen indexes, one set per database path, which are loaded the first time that they are used
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.memory_mb = 64
+        self.bloom_min = 1000000
+
+    def get(self, path, conn):
+        """
+        Grabs the query indexes of a database, or None if they don't fit into the memory budget
+        """
+
+        with self.lock:
+            if path in self.indexes:
+                return self.indexes[path]
+
+            index = None
+
+            # Each ID takes 8 bytes, plus about 10 bits in the Bloom filter
+            count = conn.execute('SELECT COUNT(*) FROM PRODUCT_QUERIES;').fetchone()[0]
+            if count * 10 > self.memory_mb * 1024 * 1024:
+                logging.warning(f'Not indexing {count} products, as they would not fit within {self.memory_mb}MB')
+            else:
+                generation = conn.execute('SELECT VALUE FROM COUNTERS WHERE NAME = "expired";').fetchone()[0]
+                index = QueryIndexes(self.bloom_min, generation)
+
+                # The rows come out already sorted by the primary key
+                cursor = conn.execute('SELECT QUERY, ID FROM PRODUCT_QUERIES ORDER BY QUERY, ID;')
+                for query, rows in itertools.groupby(cursor, key=lambda row: row[0]):
+                    index.indexes[query] = SeenIndex((row[1] for row in rows if isinstance(row[1], int)), self.bloom_min)
+
+                logging.info(f'Indexed {len(index)} products over {len(index.indexes)} queries')
+
+            self.indexes[path] = index
+            return index
+
+    def invalidate(self, path):
+        """
+        Throws away the indexes of a database, so that they get loaded again the next time that they are used
+        """
+
+        with self.lock:
+            self.indexes.pop(path, None)
+
+seen_indexes = SeenIndexes()
@@ -1,7 +1,6 @@
-import yagmail
-import datetime
+import datetime, html, re
+from email.message import EmailMessage
 from config import config
-import logging
 
 template = (
 '<!DOCTYPE html>'
@@ -22,7 +21,7 @@ template = (
 '     <table role="presentation" style="width:94%;max-width:600px;border:none;border-spacing:0;text-align:left;font-family:Arial,sans-serif;font-size:16px;line-height:22px;color:#363636;">'    
 '      <tr>'
 '       <td style="padding:30px;background-color:#ffffff;">'
-'        <h1 style="margin-top:0;margin-bottom:16px;font-size:26px;line-height:22px;font-weight:bold;letter-spacing:-0.02em;">{new_products} New Products found!</h1>'
+'        <h1 style="margin-top:0;margin-bottom:16px;font-size:26px;line-height:22px;font-weight:bold;letter-spacing:-0.02em;">{new_products} New Products found!{part}</h1>'
 '        <p style="margin:0;">CL-Checker has found you {new_products} new products on Craigslist that match your search queries!</p>'
 '        <br>'
 '        {contents}'
@@ -42,50 +41,163 @@ template = (
 '</html>'
 )
 
-def send_email(total_products):
-    # Generate the contents
-    contents = ''
-    total_found = 0
-    
-    # Generate the contents of the email
-    for i, (query, products) in enumerate(total_products.items()):
-        # Create a header
-        contents += f'<b>Products found for {query}:</b>'
-        contents += '<ul>'
-    
-        # Create a list of the products
-        for product in products:
-            contents += f'<li><a href="{product.url}" style="color: #670067;text-decoration: underline;">{product.name}</a></li>'
-            total_found += 1
-
-        contents += '</ul>'
-
-        # Add a separator if not the last one
-        if i != len(total_products)-1:
-            contents += '<br><hr><br>'
+# The template is split around the contents, so that the contents never need to go through format()
+template_head, template_tail = template.split('{contents}')
+
+# Pieces that the contents of an email are built out of
+section_head = '<b>Products found for {query}:</b><ul>'
+section_more = '<li>and {more} more...</li>'
+section_tail = '</ul>'
+section_separator = '<br><hr><br>'
+
+# Matches any of the characters that html.escape() replaces
+ESCAPE_RE = re.compile('[&<>"\']')
+
+def escape(text):
+    # Most text doesn't need escaping, and checking for that is a lot faster than escaping it
+    return html.escape(text) if ESCAPE_RE.search(text) != None else text
+
+def escape_all(texts):
+    """
+    Escapes a whole list of text at once, which is a lot faster than going through it one by one
+    """
+
+    # Searching for each of the characters on it's own is a lot faster than a regex over this much text
+    joined = '\0'.join(texts)
+    if not any(char in joined for char in '&<>"\''):
+        return texts
+
+    escaped = html.escape(joined).split('\0')
+
+    # Fall back to escaping them one by one if any of the text had a NUL of it's own
+    return escaped if len(escaped) == len(texts) else [escape(text) for text in texts]
+
+def render_rows(products):
+    """
+    Renders the HTML rows of a list of products
+    """
+
+    urls = escape_all([product.url for product in products])
+    names = escape_all([product.name for product in products])
+
+    return [f'<li><a href="{url}" style="color: #670067;text-decoration: underline;">{name}</a></li>' for url, name in zip(urls, names)]
+
+def plan_emails(total_products, max_per_query, max_bytes):
+    """
+    Splits the products up between as few emails as possible, while keeping the contents of each one under
+    max_bytes, and only showing the first max_per_query products of each query. (Either is unlimited when 0)
+    Returns a list of emails, each of which is a list of (query, products, rows, more) sections.
+    """
+
+    emails = []
+    sections = []
+    size = 0
+
+    for query, products in total_products.items():
+        if len(products) == 0:
+            continue
+
+        shown = products[:max_per_query] if max_per_query > 0 else products
+        more = len(products) - len(shown)
+        rows = render_rows(shown)
+
+        # Without a size limit everything goes in the one email, so there's no need to measure anything
+        if max_bytes <= 0:
+            sections.append((query, shown, rows, more))
+            continue
+
+        # Size of everything in the section besides the rows
+        overhead = len(section_head) + len(escape(query).encode()) + len(section_tail) + len(section_separator)
+        if more:
+            overhead += len(section_more) + 10
+
+        start = 0
+        size += overhead
+
+        for i, row in enumerate(rows):
+            row_size = len(row) if row.isascii() else len(row.encode())
+
+            # Carry on in a new email once this one is full, as long as there's something in it
+            if size + row_size > max_bytes and (i > start or sections):
+                if i > start:
+                    sections.append((query, shown[start:i], rows[start:i], 0))
+
+                emails.append(sections)
+                sections, start, size = [], i, overhead
+
+            size += row_size
+
+        sections.append((query, shown[start:], rows[start:], more))
+
+    if sections:
+        emails.append(sections)
+
+    return emails
+
+def build_emails(total_products):
+    """
+    Builds the subject, HTML body and plain text body of each email for the newly found products
+    """
+
+    plan = plan_emails(total_products, config.email_max_per_query, config.email_max_bytes)
+    total_found = sum(len(products) for products in total_products.values())
 
     # Get the current time
     date = datetime.datetime.now()
 
-    # Now actually send the email
-    try:
-        # Login to the email
-        yag = yagmail.SMTP(config.from_email, config.from_password)
-        
-        # Send the email
-        yag.send(
-            to=config.to_email,
-            subject=f'CL-Checker - {total_found} new products found!',
-            contents=template.format(
-                new_products=total_found, 
-                contents=contents,
-                date=date.strftime('%B %d %Y'),
-                time=date.strftime('%I:%M %p')
-            ),
-        )
-        
-    except:
-        logging.error(f'Failed to send email from {config.from_email} to {config.to_email}')
-        return False
-    
-    return True
+    emails = []
+
+    for i, sections in enumerate(plan):
+        part = f' ({i + 1}/{len(plan)})' if len(plan) > 1 else ''
+        subject = f'CL-Checker - {total_found} new products found!{part}'
+
+        # Generate the contents of the email, reusing the rows that were rendered while planning
+        contents = []
+        lines = [subject, '']
+
+        for query, products, rows, more in sections:
+            if contents:
+                contents.append(section_separator)
+
+            contents.append(section_head.format(query=escape(query)))
+            contents.extend(rows)
+            lines.append(f'Products found for {query}:')
+            lines.extend([f'- {product.name}: {product.url}' for product in products])
+
+            if more:
+                contents.append(section_more.format(more=more))
+                lines.append(f'- and {more} more...')
+
+            contents.append(section_tail)
+            lines.append('')
+
+        body = ''.join([
+            template_head.format(new_products=total_found, part=part),
+            ''.join(contents),
+            template_tail.format(date=date.strftime('%B %d %Y'), time=date.strftime('%I:%M %p')),
+        ])
+
+        emails.append((subject, body, '\n'.join(lines)))
+
+    return emails
+
+def build_messages(total_products):
+    """
+    Builds the complete email messages for the newly found products
+    """
+
+    messages = []
+
+    for subject, body, text in build_emails(total_products):
+        message = EmailMessage()
+        message['Subject'] = subject
+        message['From'] = config.from_email
+        message['To'] = config.to_email
+
+        # Include a plain text version for clients that don't show HTML
+        message.set_content(text)
+        message.add_alternative(body, subtype='html')
+
+        messages.append(message)
+
+    return messages
@@ -0,0 +1,38 @@
+import time, logging
+
+class StartupReport:
+    """
+    Keeps track of how long each phase of starting up takes, so that slow startups can be tracked down
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.phases = []
+        self.reported = False
+
+    def mark(self, name):
+        """
+        Ends the current phase of starting up, with the given name
+        """
+
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def report(self, label='Startup'):
+        """
+        Logs how long each phase took, only the first time that it's called
+        """
+
+        if self.reported:
+            return
+
+        self.reported = True
+        total = time.perf_counter() - self.start
+
+        breakdown = ', '.join(f'{name} {secs * 1000:.0f}ms' for name, secs in self.phases)
+        logging.info(f'{label} took {total * 1000:.0f}ms ({breakdown})')
+
+# Created as soon as possible, so that the imports get counted too
+startup = StartupReport()
@@ -0,0 +1,196 @@
+import os, json, threading, logging, collections
+
+import psutil
+
+class BrowserSupervisor:
+    """
+    Keeps an eye on the processes of the browser sessions. Chrome keeps growing the longer that it runs,
+    so sessions that use too much memory or have loaded too many pages get recycled between queries. The
+    processes of each session are also recorded on disk, so that any that outlive their session (e.g. after
+    a crash, or when Chrome dies under chromedriver) can be killed off later on.
+    """
+
+    def __init__(self, max_mb, max_pages, registry_dir):
+        self.max_mb = max_mb
+        self.max_pages = max_pages
+
+        self.lock = threading.Lock()
+        self.sessions = {}
+
+        # Why sessions were recycled, and how many leftover processes were killed
+        self.recycles = collections.Counter()
+        self.reaped = 0
+
+        # Each process that runs browsers keeps it's own registry, so that running the GUI and the daemon side by side is fine
+        self.registry_dir = registry_dir
+        self.owner = psutil.Process()
+        self.registry_path = os.path.join(registry_dir, f'{self.owner.pid}.json')
+
+    def processes(self, session):
+        """
+        Grabs the processes of a session, i.e. the driver and all of the browser processes under it
+        """
+
+        try:
+            root = psutil.Process(session.pid)
+            return [root] + root.children(recursive=True)
+        except psutil.Error:
+            return []
+
+    def track(self, session, processes=None):
+        """
+        Records the processes of a session, so that they can be cleaned up if they get left behind
+        """
+
+        if processes == None:
+            processes = self.processes(session)
+
+        tracked = set()
+        for process in processes:
+            try:
+                tracked.add((process.pid, process.create_time()))
+            except psutil.Error:
+                pass
+
+        with self.lock:
+            # Keep the ones that have already exited too, in case they were reused
+            self.sessions[id(session)] = self.sessions.get(id(session), set()) | tracked
+            self.save()
+
+    def retire(self, session):
+        """
+        Checks if a session should be recycled, returning the reason why or None if it can carry on
+        """
+
+        processes = self.processes(session)
+        self.track(session, processes)
+
+        mb = 0
+        for process in processes:
+            try:
+                mb += process.memory_info().rss / (1024 * 1024)
+            except psutil.Error:
+                pass
+
+        reason = None
+        if self.max_mb > 0 and mb >= self.max_mb:
+            reason = 'memory'
+        elif self.max_pages > 0 and session.pages >= self.max_pages:
+            reason = 'pages'
+
+        if reason != None:
+            logging.info(f'Recycling browser session after {session.pages} pages, using {mb:.0f}MB over {len(processes)} processes ({reason} limit)')
+
+            with self.lock:
+                self.recycles[reason] += 1
+
+        return reason
+
+    def release(self, session):
+        """
+        Kills whatever is left of a session's processes, once it's been closed
+        """
+
+        # Anything that was started since the last check is still under the driver, if it's alive
+        self.track(session)
+
+        with self.lock:
+            tracked = self.sessions.pop(id(session), set())
+            self.save()
+
+        killed = self.kill(tracked)
+        if killed:
+            logging.warning(f'Killed {killed} leftover browser processes')
+
+    def reap(self):
+        """
+        Kills the browser processes of any earlier runs that didn't get to clean up after themselves
+        """
+
+        try:
+            names = os.listdir(self.registry_dir)
+        except OSError:
+            return
+
+        for name in names:
+            path = os.path.join(self.registry_dir, name)
+            if not name.endswith('.json') or path == self.registry_path:
+                continue
+
+            # Skip over any registries that are unreadable or half written
+            try:
+                with open(path, 'r') as f:
+                    registry = json.load(f)
+
+                pid, create_time = registry['owner']
+                owner = (pid, create_time)
+                processes = [(pid, create_time) for pid, create_time in registry['processes']]
+            except (OSError, ValueError, KeyError, TypeError):
+                continue
+
+            # Leave the browsers of any other instances that are still running alone
+            if self.is_running(owner):
+                continue
+
+            killed = self.kill(processes)
+            if killed:
+                logging.warning(f'Reaped {killed} orphaned browser processes')
+
+                with self.lock:
+                    self.reaped += killed
+
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def summary(self):
+        with self.lock:
+            recycles = sum(self.recycles.values())
+            reasons = ', '.join(f'{reason} {count}' for reason, count in sorted(self.recycles.items()))
+
+            return f'recycled {recycles}' + (f' ({reasons})' if reasons else '') + f', reaped {self.reaped} orphans'
+
+    def is_running(self, process):
+        pid, create_time = process
+
+        try:
+            return psutil.Process(pid).create_time() == create_time
+        except psutil.Error:
+            return False
+
+    def kill(self, processes):
+        """
+        Kills the given processes that are still running, returning how many were killed
+        """
+
+        victims = []
+        for pid, create_time in processes:
+            try:
+                process = psutil.Process(pid)
+
+                # Make sure that it's the same process, and not a new one that reused the PID
+                if process.create_time() == create_time:
+                    process.kill()
+                    victims.append(process)
+            except psutil.Error:
+                pass
+
+        psutil.wait_procs(victims, timeout=5)
+        return len(victims)
+
+    def save(self):
+        # Only keep a registry around while there are sessions to clean up after
+        processes = [list(process) for tracked in self.sessions.values() for process in tracked]
+
+        try:
+            if processes:
+                os.makedirs(self.registry_dir, exist_ok=True)
+
+                with open(self.registry_path, 'w') as f:
+                    json.dump({'owner': [self.owner.pid, self.owner.create_time()], 'processes': processes}, f)
+
+            elif os.path.exists(self.registry_path):
+                os.remove(self.registry_path)
+        except OSError as e:
+            logging.warning(f'Unable to save the browser registry: {e}')
@@ -0,0 +1,6 @@
+import os, sys, tempfile
+
+# Keep the config, databases and such that the tests make out of the real AppData directory
+os.environ['LOCALAPPDATA'] = tempfile.mkdtemp(prefix='cl-checker-tests-')
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -0,0 +1,87 @@
+"""
+Checks that the browser pool gives up quickly when sessions can't be had
+"""
+
+import threading, time, unittest
+
+from browser_pool import BrowserPool
+
+class Session:
+    def __init__(self):
+        self.closed = False
+
+    def is_alive(self):
+        return True
+
+    def close(self):
+        self.closed = True
+
+def failing_factory():
+    raise Exception('Chrome is not installed')
+
+class BrowserPoolTest(unittest.TestCase):
+    def test_raises_start_failure_right_away(self):
+        pool = BrowserPool(2, failing_factory, timeout=30)
+
+        start = time.monotonic()
+        with self.assertRaisesRegex(Exception, 'Chrome is not installed'):
+            pool.checkout()
+
+        # Later checkouts don't try again until the retry delay has passed, so they fail straight away
+        with self.assertRaisesRegex(Exception, 'Chrome is not installed'):
+            pool.checkout()
+
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_stops_waiting_when_interrupted(self):
+        stop = threading.Event()
+        started = threading.Event()
+
+        def slow_factory():
+            started.set()
+            time.sleep(3)
+            return Session()
+
+        pool = BrowserPool(1, slow_factory, timeout=30, interrupted=stop.is_set)
+        threading.Timer(0.2, stop.set).start()
+
+        start = time.monotonic()
+        with self.assertRaisesRegex(Exception, 'Interrupted'):
+            pool.checkout()
+
+        self.assertLess(time.monotonic() - start, 2)
+        pool.close()
+
+    def test_discards_sessions_started_after_closing(self):
+        release = threading.Event()
+        sessions = []
+
+        def blocked_factory():
+            release.wait()
+            sessions.append(Session())
+            return sessions[-1]
+
+        pool = BrowserPool(1, blocked_factory)
+        pool.warm()
+        pool.close()
+        release.set()
+
+        for _ in range(50):
+            if sessions and sessions[0].closed:
+                break
+
+            time.sleep(0.05)
+
+        self.assertTrue(sessions[0].closed)
+        self.assertTrue(pool.idle.empty())
+
+    def test_reuses_returned_sessions(self):
+        pool = BrowserPool(1, Session)
+        session = pool.checkout()
+        pool.checkin(session)
+
+        self.assertIs(pool.checkout(), session)
+        pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
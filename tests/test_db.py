@@ -0,0 +1,78 @@
+"""
+Checks the parts of the database that have to hold up across separate runs and processes
+"""
+
+import os, sys, tempfile, unittest, subprocess
+
+from db import DB, Product
+from connection import connections
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+class DBTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'test.db')
+
+    def tearDown(self):
+        connections.close()
+        self.dir.cleanup()
+
+    def reopen(self):
+        # Like a new run of the daemon, which starts out with a fresh connection
+        connections.close()
+        return DB(self.path)
+
+    def test_full_crawls_survive_restarts(self):
+        db = DB(self.path)
+        self.assertEqual(db.get_full_crawl('https://a.craigslist.org/search/sss?query=x'), 0)
+
+        db.set_full_crawl('https://a.craigslist.org/search/sss?query=x', 1000.5)
+        db.set_full_crawl('https://a.craigslist.org/search/sss?query=x', 2000.5)
+
+        db = self.reopen()
+        self.assertEqual(db.get_full_crawl('https://a.craigslist.org/search/sss?query=x'), 2000.5)
+        self.assertEqual(db.get_full_crawl('https://a.craigslist.org/search/sss?query=y'), 0)
+
+    def test_products_expired_by_another_process_are_new_again(self):
+        db = DB(self.path)
+        query_url = 'https://a.craigslist.org/search/sss?query=x'
+        product = Product(7000000001, 'Desk', 'https://a.craigslist.org/sss/d/desk/7000000001.html', query_url)
+
+        self.assertEqual(db.upsert_products([product]), {product.id})
+        self.assertEqual(db.upsert_products([product]), set())
+
+        # Let the product go stale, and have another process (like the daemon next to the GUI) expire it
+        with db.conn:
+            db.conn.execute('UPDATE PRODUCTS SET SEEN = datetime("now", "-30 days");')
+            db.conn.execute('UPDATE PRODUCT_QUERIES SET SEEN = datetime("now", "-30 days");')
+
+        subprocess.run(
+            [sys.executable, '-c', f'from db import DB; db = DB({self.path!r}); [db.expire_products(7, 100) for _ in range(3)]'],
+            cwd=SRC_DIR, env=os.environ, check=True, capture_output=True
+        )
+
+        self.assertIsNone(db.conn.execute('SELECT ID FROM PRODUCTS;').fetchone())
+
+        # This process's index still had the product, but it has to be reported as new again
+        self.assertEqual(db.upsert_products([product]), {product.id})
+        self.assertEqual(db.upsert_products([product]), set())
+
+    def test_expiring_keeps_own_index_in_sync(self):
+        db = DB(self.path)
+        query_url = 'https://a.craigslist.org/search/sss?query=x'
+        products = [Product(7000000000 + id, f'Product #{id}', f'https://a.craigslist.org/{id}.html', query_url) for id in range(10)]
+
+        db.upsert_products(products)
+
+        with db.conn:
+            db.conn.execute('UPDATE PRODUCTS SET SEEN = datetime("now", "-30 days") WHERE ID < 7000000005;')
+            db.conn.execute('UPDATE PRODUCT_QUERIES SET SEEN = datetime("now", "-30 days") WHERE ID < 7000000005;')
+
+        while db.expire_products(7, 2):
+            pass
+
+        self.assertEqual(db.upsert_products(products), {product.id for product in products[:5]})
+
+if __name__ == '__main__':
+    unittest.main()
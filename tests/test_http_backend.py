@@ -0,0 +1,129 @@
+"""
+Drives the HTTP backend and the parsers against a local server that serves the recorded Craigslist pages
+"""
+
+import os, threading, unittest, http.server
+
+from engine import Engine, Fetcher, HttpBackend, SeleniumBackend, Backend
+from page_parser import parse_page1
+from ratelimit import HostRateLimiter
+from metrics import QueryStats
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'fixtures')
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), 'r', encoding='utf-8') as f:
+        return f.read()
+
+# The first page links to the second one, which is the last
+PAGES = {
+    '/search/sss?query=test': fixture('layout1-25.html'),
+    '/search/sss?query=test&s=120': fixture('layout1-120.html').replace('class="button next"', 'class="button next disabled"'),
+    '/search/sss?query=js': fixture('layout2-25.html'),
+}
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Craigslist often turns away clients that aren't browsers
+        if self.path.startswith('/forbidden'):
+            self.send_error(403)
+            return
+
+        page = PAGES.get(self.path)
+        if page == None:
+            self.send_error(404)
+            return
+
+        body = page.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class BrowserStandIn(Backend):
+    """
+    Stands in for a browser session, loading every page as the 'result-row' fixture
+    """
+
+    name = SeleniumBackend.name
+    can_page2 = True
+
+    def get(self, url):
+        self.url = url
+        self.source = PAGES['/search/sss?query=test']
+
+    def can_parse(self):
+        return True
+
+class PoolStandIn:
+    def checkout(self):
+        return BrowserStandIn()
+
+    def checkin(self, session):
+        pass
+
+class HttpBackendTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.backend = HttpBackend(timeout=5)
+
+    def tearDown(self):
+        self.backend.close()
+
+    def test_pages_through_results(self):
+        self.backend.get(self.url + '/search/sss?query=test')
+        self.assertTrue(self.backend.can_parse())
+        self.assertFalse(self.backend.can_page2)
+
+        first = parse_page1(self.backend.page_source)
+        self.assertEqual(len(first), 25)
+
+        # The next link is relative, so it has to be resolved against the page's URL
+        self.assertTrue(self.backend.next_page1())
+        self.assertEqual(self.backend.current_url, self.url + '/search/sss?query=test&s=120')
+
+        second = parse_page1(self.backend.page_source)
+        self.assertEqual(len(second), 120)
+        self.assertFalse(self.backend.next_page1())
+
+    def test_rejects_javascript_layout(self):
+        self.backend.get(self.url + '/search/sss?query=js')
+        self.assertFalse(self.backend.can_parse())
+
+    def test_raises_on_http_errors(self):
+        with self.assertRaises(Exception):
+            self.backend.get(self.url + '/forbidden')
+
+    def test_falls_back_to_browser(self):
+        engine = Engine()
+        engine.limiter = HostRateLimiter(1000, 1000)
+        fetcher = Fetcher(PoolStandIn())
+        query_url = self.url + '/forbidden?query=test'
+
+        try:
+            backend = engine.load(fetcher, query_url, QueryStats(query_url, ['test']))
+            self.assertEqual(backend.name, SeleniumBackend.name)
+            self.assertEqual(len(parse_page1(backend.page_source)), 25)
+
+            # Later cycles start with the backend that worked
+            self.assertEqual(engine.query_backends[query_url], SeleniumBackend.name)
+        finally:
+            fetcher.close()
+            engine.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+Delivers emails through the notifier to a throwaway SMTP server on localhost
+"""
+
+import email, email.policy, socketserver, threading, time, unittest
+
+from config import config
+from db import Product
+from notifier import Notifier
+
+class SmtpStandIn(socketserver.ThreadingTCPServer):
+    """
+    Bare-bones SMTP server that keeps every message it gets, and can turn away the first few connections
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SmtpHandler)
+        self.connections = 0
+        self.refuse = 0
+        self.messages = []
+
+class SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+
+        if self.server.refuse > 0:
+            self.server.refuse -= 1
+            self.reply('421 Too busy, try again later')
+            return
+
+        self.reply('220 localhost SMTP stand-in')
+        data = None
+
+        for line in self.rfile:
+            line = line.decode('utf-8').rstrip('\r\n')
+
+            if data != None:
+                if line == '.':
+                    self.server.messages.append(email.message_from_string('\n'.join(data), policy=email.policy.default))
+                    data = None
+                    self.reply('250 Queued')
+                else:
+                    data.append(line[1:] if line.startswith('..') else line)
+
+                continue
+
+            command = line.split(' ')[0].upper()
+            if command == 'DATA':
+                data = []
+                self.reply('354 Go ahead')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+def products(query, count, start=0):
+    return {query: [Product(7000000000 + id, f'{query} #{id}', f'https://a.craigslist.org/{id}.html', query) for id in range(start, start + count)]}
+
+class NotifierTest(unittest.TestCase):
+    SETTINGS = ['smtp_host', 'smtp_port', 'smtp_ssl', 'smtp_starttls', 'from_email', 'from_password', 'to_email',
+                'email_merge_secs', 'email_retries', 'email_backoff_secs', 'email_max_backoff_secs']
+
+    def setUp(self):
+        self.server = SmtpStandIn()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        # Point the email settings at the stand-in, without touching the saved config
+        self.saved = {name: getattr(config, name) for name in NotifierTest.SETTINGS}
+        config.smtp_host = '127.0.0.1'
+        config.smtp_port = self.server.server_address[1]
+        config.smtp_ssl = False
+        config.smtp_starttls = False
+        config.from_email = 'checker@localhost'
+        config.from_password = ''
+        config.to_email = 'me@localhost'
+        config.email_merge_secs = 0.5
+        config.email_retries = 2
+        config.email_backoff_secs = 0.01
+        config.email_max_backoff_secs = 0.05
+
+        self.reports = []
+        self.notifier = Notifier(lambda ok, message: self.reports.append(ok))
+
+    def tearDown(self):
+        self.notifier.stop(timeout=5)
+        self.server.shutdown()
+        self.server.server_close()
+
+        for name, value in self.saved.items():
+            setattr(config, name, value)
+
+    def test_reuses_session(self):
+        self.assertTrue(self.notifier.deliver(products('desk', 2)))
+        self.assertTrue(self.notifier.deliver(products('chair', 3)))
+
+        self.assertEqual(len(self.server.messages), 2)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.reports, [True, True])
+
+    def test_retries_after_failure(self):
+        self.server.refuse = 1
+
+        self.assertTrue(self.notifier.deliver(products('desk', 2)))
+
+        self.assertEqual(self.server.connections, 2)
+        self.assertEqual(len(self.server.messages), 1)
+        self.assertEqual(self.reports, [True])
+
+    def test_gives_up_after_retries(self):
+        self.server.refuse = 10
+
+        self.assertFalse(self.notifier.deliver(products('desk', 2)))
+
+        self.assertEqual(self.server.connections, config.email_retries + 1)
+        self.assertEqual(self.reports, [False])
+
+    def test_merges_batches_within_window(self):
+        self.notifier.start()
+        self.notifier.submit(products('desk', 2))
+        self.notifier.submit(products('chair', 1))
+
+        # The same product showing up again doesn't get listed twice
+        self.notifier.submit(products('desk', 3, start=1))
+
+        for _ in range(100):
+            if self.reports:
+                break
+
+            time.sleep(0.05)
+
+        self.assertEqual(self.reports, [True])
+        self.assertEqual(len(self.server.messages), 1)
+
+        body = self.server.messages[0].get_body(('plain',)).get_payload(decode=True).decode('utf-8')
+        for id in range(4):
+            self.assertEqual(body.count(f'desk #{id}'), 1)
+
+        self.assertIn('chair #0', body)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+"""
+Checks that profiling can't take down an update cycle
+"""
+
+import os, tempfile, unittest
+
+from profiler import CycleProfiler
+from engine import Engine
+
+class CycleProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_profiles_armed_cycles(self):
+        profiler = CycleProfiler(os.path.join(self.dir.name, 'profiles'))
+        profiler.arm(1)
+
+        self.assertTrue(profiler.start_cycle())
+
+        with profiler.job([2, 1]):
+            sum(range(10000))
+
+        profiler.end_cycle()
+
+        files = os.listdir(profiler.cycle_dir)
+        self.assertEqual(sorted(files), ['cycle.prof', 'queries-1-2.prof', 'stacks.folded'])
+
+        # Only the armed number of cycles get profiled
+        self.assertFalse(profiler.start_cycle())
+
+    def test_unwritable_directory_skips_profiling(self):
+        # A file where the profiles directory should be, so that it can't be created
+        path = os.path.join(self.dir.name, 'profiles')
+        open(path, 'w').close()
+
+        profiler = CycleProfiler(path)
+        profiler.arm(1)
+
+        self.assertFalse(profiler.start_cycle())
+        self.assertEqual(profiler.cycles_left, 0)
+
+    def test_failed_cycle_stops_profiling(self):
+        engine = Engine()
+        engine.profiler = CycleProfiler(os.path.join(self.dir.name, 'profiles'))
+        engine.profiler.arm(1)
+
+        # Blow up part way through the cycle, after the database has been setup
+        def reap():
+            raise KeyError('owner')
+
+        engine.supervisor.reap = reap
+
+        try:
+            with self.assertRaises(KeyError):
+                engine.update_queries()
+
+            self.assertFalse(engine.profiling)
+            self.assertFalse(engine.profiler.sampler.is_alive())
+            self.assertIn('cycle.prof', os.listdir(engine.profiler.cycle_dir))
+
+            # The failed cycle still gets counted
+            self.assertEqual(engine.metrics.cycles, 1)
+            self.assertEqual(engine.metrics.last_cycle['status'], 'bad')
+        finally:
+            engine.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+"""
+Checks that the readiness checks don't accept a page before it has been rendered
+"""
+
+import unittest
+
+from readiness import Readiness
+
+OLD_URL = 'https://a.craigslist.org/search/sss?query=x#search=1~gallery~0~0'
+NEW_URL = 'https://a.craigslist.org/search/sss?query=x#search=1~gallery~1~0'
+
+class ScriptedDriver:
+    """
+    Stands in for a browser, going through a list of page states one poll at a time
+    """
+
+    def __init__(self, states):
+        self.states = states
+        self.polls = 0
+        self.current_url = states[0]['url']
+
+    def execute_script(self, script):
+        state = self.states[min(self.polls, len(self.states) - 1)]
+        self.polls += 1
+        return state
+
+def state(url, rows, fingerprint):
+    return {'url': url, 'loading': False, 'results1': False, 'rows2': rows, 'fingerprint': fingerprint}
+
+class ReadinessTest(unittest.TestCase):
+    def setUp(self):
+        self.readiness = Readiness(timeout=2, poll_secs=0.001)
+
+    def test_page_turn_waits_for_new_rows(self):
+        # The hash changes straight away, but the old page's rows stick around for a few polls
+        states = [state(NEW_URL, 120, '100|219')] * 5 + [state(NEW_URL, 120, '220|339')] * 3
+        driver = ScriptedDriver(states)
+
+        self.readiness.wait_page_turn(driver, OLD_URL, '100|219')
+
+        self.assertEqual(driver.polls, 8)
+        self.assertEqual(self.readiness.timeouts['page turn'], 0)
+
+    def test_page_turn_times_out_on_the_same_rows(self):
+        driver = ScriptedDriver([state(NEW_URL, 120, '100|219')])
+        self.readiness.timeout = 0.05
+
+        self.readiness.wait_page_turn(driver, OLD_URL, '100|219')
+        self.assertEqual(self.readiness.timeouts['page turn'], 1)
+
+    def test_reset_clears_summary(self):
+        driver = ScriptedDriver([state(NEW_URL, 120, '220|339')])
+        self.readiness.wait_page_turn(driver, OLD_URL, '100|219')
+        self.assertIn('page turn', self.readiness.summary())
+
+        self.readiness.reset()
+        self.assertEqual(self.readiness.summary(), '')
+
+if __name__ == '__main__':
+    unittest.main()